@@ -0,0 +1,120 @@
+import os
+import json
+import hashlib
+import pandas as pd
+from sqlalchemy import select, table, column, func, text
+from sqlalchemy.exc import DBAPIError
+
+# Accés a les dades dels motors
+# Llegeix de la base de dades només el que fan servir els motors: les columnes necessàries, els treballadors
+# (i les seves limitacions) del torn demanat i els pròxims n_dies laborables, amb els filtres fets a SQL.
+# Les consultes es construeixen amb SQLAlchemy Core, de manera que funcionen igual amb SQL Server
+# (TOP, ordenació al servidor) que amb una base de dades SQLite local per a proves.
+#
+# Snapshot local: el resultat es guarda en fitxers Parquet a carpeta_snapshots juntament amb una clau que combina
+# un testimoni de canvis de les taules d'origen i els paràmetres de la consulta (torn, dia d'avui i n_dies).
+# Si la clau no ha canviat, la càrrega següent llegeix els Parquet sense tornar a consultar les taules.
+#   - SQL Server: només es consulten metadades, sense llegir les taules. Si totes les taules d'origen tenen el
+#     seguiment de canvis (change tracking) activat, el testimoni és CHANGE_TRACKING_CURRENT_VERSION(); si no,
+#     l'última modificació de cada taula (last_user_update de sys.dm_db_index_usage_stats) i l'hora d'arrencada
+#     del servidor, perquè aquestes estadístiques es buiden quan es reinicia. Si l'usuari no té permís per
+#     consultar-les, no es fa snapshot.
+#   - SQLite: la data de modificació i la mida del fitxer de la base de dades (i del -wal, si n'hi ha).
+# Amb altres motors de base de dades, o si no hi ha cap llibreria de Parquet instal·lada, no es fa snapshot.
+carpeta_snapshots = 'snapshot_dades'
+
+posicions_t = table('posicions', column('id_posicio'), column('posicio'), column('clasificador'),
+                    column('id_limitacio'), column('familia'))
+treballadors_t = table('treballadors', column('id_treballador'), column('nom'), column('data_antiguitat'),
+                       column('torn'))
+limitacions_t = table('treballador_limitacio', column('id_treballador'), column('id_limitacio'))
+calendari_t = table('calendari_laboral', column('aany'), column('numero_mes'), column('numero_dia'),
+                    column('es_laborable'))
+taules_origen = ['posicions', 'treballadors', 'treballador_limitacio', 'calendari_laboral']
+
+# Consultes del torn; la data del calendari es compara com a enter aaaammdd perquè sigui portable entre motors
+def consultes(torn, avui, n_dies):
+    del_torn = func.lower(treballadors_t.c.torn) == torn.lower()
+    data = calendari_t.c.aany * 10000 + calendari_t.c.numero_mes * 100 + calendari_t.c.numero_dia
+    return {
+        'posicions': select(posicions_t),
+        'treballadors': select(treballadors_t.c.id_treballador, treballadors_t.c.nom, treballadors_t.c.data_antiguitat)
+                        .where(del_torn),
+        'limitacions': select(limitacions_t)
+                       .where(limitacions_t.c.id_treballador.in_(select(treballadors_t.c.id_treballador).where(del_torn))),
+        'calendari': select(calendari_t.c.aany, calendari_t.c.numero_mes, calendari_t.c.numero_dia)
+                     .where(calendari_t.c.es_laborable == 1, data >= int(avui.strftime('%Y%m%d')))
+                     .order_by(calendari_t.c.aany, calendari_t.c.numero_mes, calendari_t.c.numero_dia)
+                     .limit(n_dies),
+    }
+
+def testimoni_canvis(engine):
+    if engine.dialect.name == 'sqlite':
+        fitxer = engine.url.database
+        if not fitxer or fitxer == ':memory:':
+            return None
+        estats = [os.stat(f) for f in [fitxer, fitxer + '-wal'] if os.path.exists(f)]
+        return [[estat.st_mtime_ns, estat.st_size] for estat in estats]
+    if engine.dialect.name == 'mssql':
+        objectes = ", ".join(f"OBJECT_ID('{taula}')" for taula in taules_origen)
+        try:
+            with engine.connect() as connexio:
+                versio, amb_seguiment = connexio.execute(text(
+                    f"SELECT CHANGE_TRACKING_CURRENT_VERSION(), "
+                    f"(SELECT COUNT(*) FROM sys.change_tracking_tables WHERE object_id IN ({objectes}))")).one()
+                if versio is not None and amb_seguiment == len(taules_origen):
+                    return ['change_tracking', versio]
+                arrencada = connexio.execute(text("SELECT sqlserver_start_time FROM sys.dm_os_sys_info")).scalar()
+                modificacions = connexio.execute(text(
+                    f"SELECT OBJECT_NAME(object_id), MAX(last_user_update) FROM sys.dm_db_index_usage_stats "
+                    f"WHERE database_id = DB_ID() AND object_id IN ({objectes}) GROUP BY object_id"))
+                return ['usage_stats', arrencada, sorted([list(fila) for fila in modificacions], key=str)]
+        except DBAPIError:
+            return None
+    return None
+
+def llegir_snapshot(prefix, clau):
+    try:
+        with open(prefix + '.json', encoding='utf-8') as f:
+            if json.load(f)['clau'] != clau:
+                return None
+        return {nom: pd.read_parquet(f'{prefix}_{nom}.parquet') for nom in ['posicions', 'treballadors', 'limitacions', 'calendari']}
+    except (OSError, ValueError, KeyError, ImportError):
+        return None
+
+def guardar_snapshot(prefix, clau, taules):
+    try:
+        os.makedirs(os.path.dirname(prefix), exist_ok=True)
+        for nom, taula in taules.items():
+            taula.to_parquet(f'{prefix}_{nom}.parquet', index=False)
+    except ImportError:
+        print("⚠️ No hi ha cap llibreria de Parquet (pyarrow o fastparquet): no es guarda snapshot de les dades.")
+        return
+    # La clau s'escriu l'última: un snapshot a mitges no es llegeix mai
+    with open(prefix + '.json', 'w', encoding='utf-8') as f:
+        json.dump({'clau': clau}, f)
+
+# Retorna (posicions, treballadors, limitacions_df, dies_laborables) del torn
+def carregar_taules(engine, torn='matí', n_dies=7, snapshot=True):
+    avui = pd.Timestamp.today().normalize()
+    sentencies = consultes(torn, avui, n_dies)
+
+    testimoni = testimoni_canvis(engine) if snapshot else None
+    taules = None
+    if testimoni is not None:
+        parametres = [testimoni, torn, avui.strftime('%Y-%m-%d'), n_dies,
+                      {nom: str(sentencia.compile(dialect=engine.dialect)) for nom, sentencia in sentencies.items()}]
+        clau = hashlib.sha1(json.dumps(parametres, default=str).encode('utf-8')).hexdigest()
+        prefix = os.path.join(carpeta_snapshots, hashlib.sha1(torn.encode('utf-8')).hexdigest()[:12])
+        taules = llegir_snapshot(prefix, clau)
+
+    if taules is None:
+        with engine.connect() as connexio:
+            taules = {nom: pd.read_sql(sentencia, connexio) for nom, sentencia in sentencies.items()}
+        if testimoni is not None:
+            guardar_snapshot(prefix, clau, taules)
+
+    df_calendari = taules['calendari']
+    df_calendari_rename = df_calendari.rename(columns={'aany': 'year', 'numero_mes': 'month', 'numero_dia': 'day'})
+    dies_laborables = pd.to_datetime(df_calendari_rename[['year', 'month', 'day']]).dt.strftime('%Y-%m-%d').tolist()
+    return taules['posicions'], taules['treballadors'], taules['limitacions'], dies_laborables
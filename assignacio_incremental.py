@@ -0,0 +1,105 @@
+import numpy as np
+
+# Assignació incremental amb potencials duals (camins augmentants més curts, estil Jonker-Volgenant)
+# Resol problemes d'assignació rectangulars de cost mínim com linear_sum_assignment, però conserva entre crides
+# el potencial dual de cada fila i columna (identificades per una clau: id de treballador, classe de posició...)
+# i les parelles de l'última solució. En la crida següent:
+#   - els potencials guardats inicialitzen les variables duals (es reajusten perquè siguin factibles),
+#   - les parelles anteriors que continuen sent ajustades (cost reduït zero) es mantenen,
+#   - només les files que han quedat sense parella es reparen amb un camí augmentant cadascuna.
+# Així, quan d'una hora a la següent (o d'un dia al següent) només canvien algunes restriccions,
+# la feina és proporcional a les files afectades.
+class AssignadorIncremental:
+    def __init__(self, tolerancia=1e-9):
+        self.tolerancia = tolerancia
+        self.potencials = {}
+        self.parelles = {}
+        self.augmentacions = 0
+
+    # Retorna (files, columnes) com linear_sum_assignment: tantes parelles com el costat més petit, ordenades per fila
+    def resoldre(self, cost, claus_files, claus_columnes):
+        cost = np.asarray(cost, dtype=float)
+        etiquetes_files = [('f', k) for k in claus_files]
+        etiquetes_columnes = [('c', k) for k in claus_columnes]
+        transposat = cost.shape[0] > cost.shape[1]
+        if transposat:
+            cost = cost.T
+            etiquetes_files, etiquetes_columnes = etiquetes_columnes, etiquetes_files
+        n, m = cost.shape
+
+        # Potencials inicials: els de les columnes es recuperen (com a problema rectangular, han de ser <= 0
+        # i zero a les columnes lliures) i els de les files es calculen perquè tots els costos reduïts siguin >= 0.
+        # Es mantenen les parelles anteriors que continuen ajustades; com que posar a zero el potencial de les
+        # columnes lliures pot desajustar-ne d'altres, es repeteix fins que el conjunt de parelles és estable.
+        guardats = np.array([min(self.potencials.get(etiqueta, 0.0), 0.0) for etiqueta in etiquetes_columnes])
+        columna_de = {etiqueta: j for j, etiqueta in enumerate(etiquetes_columnes)}
+        parelles_previes = [(i, columna_de.get(self.parelles.get(etiqueta))) for i, etiqueta in enumerate(etiquetes_files)]
+        parelles_previes = [(i, j) for i, j in parelles_previes if j is not None]
+        v = np.zeros(m + 1)
+        while True:
+            # p[j] és la fila assignada a la columna j (-1 si és lliure); la columna m és virtual
+            p = np.full(m + 1, -1)
+            for i, j in parelles_previes:
+                p[j] = i
+            v[:m] = np.where(p[:m] >= 0, guardats, 0.0)
+            u = (cost - v[:m]).min(axis=1) if m else np.zeros(n)
+            ajustades = [(i, j) for i, j in parelles_previes if abs(cost[i, j] - u[i] - v[j]) <= self.tolerancia]
+            if len(ajustades) == len(parelles_previes):
+                break
+            parelles_previes = ajustades
+
+        assignades = np.zeros(n, dtype=bool)
+        assignades[p[:m][p[:m] >= 0]] = True
+        for i in np.flatnonzero(~assignades):
+            self._augmentar(cost, u, v, p, i)
+            self.augmentacions += 1
+
+        # Guardar l'estat per a la crida següent
+        for i, etiqueta in enumerate(etiquetes_files):
+            self.potencials[etiqueta] = u[i]
+        for j, etiqueta in enumerate(etiquetes_columnes):
+            self.potencials[etiqueta] = v[j]
+        columnes = np.flatnonzero(p[:m] >= 0)
+        files = p[columnes]
+        for i, j in zip(files, columnes):
+            self.parelles[etiquetes_files[i]] = etiquetes_columnes[j]
+            self.parelles[etiquetes_columnes[j]] = etiquetes_files[i]
+
+        if transposat:
+            files, columnes = columnes, files
+        ordre = np.argsort(files)
+        return files[ordre], columnes[ordre]
+
+    # Afegeix la fila lliure a l'assignació amb el camí augmentant de cost reduït mínim (Dijkstra amb potencials)
+    @staticmethod
+    def _augmentar(cost, u, v, p, fila):
+        m = cost.shape[1]
+        minv = np.full(m + 1, np.inf)
+        previa = np.full(m + 1, -1)
+        usades = np.zeros(m + 1, dtype=bool)
+        p[m] = fila
+        j0 = m
+        while True:
+            usades[j0] = True
+            i0 = p[j0]
+            lliures = ~usades[:m]
+            reduit = cost[i0] - u[i0] - v[:m]
+            millora = lliures & (reduit < minv[:m])
+            minv[:m][millora] = reduit[millora]
+            previa[:m][millora] = j0
+            candidats = np.where(lliures, minv[:m], np.inf)
+            j1 = int(np.argmin(candidats))
+            delta = candidats[j1]
+            usats = np.flatnonzero(usades)
+            u[p[usats]] += delta
+            v[usats] -= delta
+            minv[~usades] -= delta
+            j0 = j1
+            if p[j0] == -1:
+                break
+        # Desfer el camí: cada columna passa a la fila de la columna anterior
+        while j0 != m:
+            j1 = previa[j0]
+            p[j0] = p[j1]
+            j0 = j1
+        p[m] = -1
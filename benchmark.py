@@ -0,0 +1,219 @@
+import os
+import sys
+import json
+import time
+import queue
+import random
+import platform
+import importlib.util
+import multiprocessing
+import numpy as np
+import pandas as pd
+import problema_assignacio
+from problema_assignacio import ProblemaAssignacio
+from generador_instancies import mides, fitxer_instancia
+from puntuacio_assignacions import normalitzar, puntuar_assignacions, violacions, pesos
+from resultats_assignacions import AssignacioNoValida
+
+# Banc de proves dels motors amb instàncies sintètiques (vegeu generador_instancies.py)
+# Per a cada motor i instància es resol el primer dia laborable en un procés nou (spawn), sense escriure CSV
+# ni pujar res a MiniO, i es mesura:
+#   - temps_preparacio: importar el motor (construir el model, índexs, etc.) amb la instància ja carregada,
+#   - temps_resolucio: resoldre el dia,
+#   - memoria_pic_mb: pic de memòria resident del procés, que és només d'aquest cas (vegeu memoria_pic_mb()),
+#   - violacions de les restriccions a les assignacions que retorna el motor (amb puntuacio_assignacions.py).
+# Els casos més grans que mida_maxima[motor] treballadors no s'executen (queden com a 'omès') i els que
+# passen de temps_maxim segons s'aturen ('temps_esgotat'). Si el motor no arriba a cap assignació vàlida
+# (AssignacioNoValida), el cas queda com a 'no_valida' però es mesura igual, amb les violacions de la millor
+# assignació que ha trobat.
+# L'informe es guarda en JSON a fitxer_informe i es compara amb fitxer_referencia: si algun cas empitjora
+# més del que permet la tolerància, es llisten les regressions i el programa acaba amb codi 1.
+# Amb guardar_referencia = True, l'informe passa a ser la nova referència.
+
+# Configuració
+motors = ['cpsat', 'hungarian', 'generic', 'deap', 'formiga']
+instancies = ['petita', 'mitjana', 'gran', 'molt_gran']
+llavor = 0
+fitxers_motors = {
+    'cpsat': 'ex1_CP-SAT.py',
+    'hungarian': 'ex4_hungarian.py',
+    'generic': 'ex1_generic.py',
+    'deap': 'ex1_deap.py',
+    'formiga': 'ex1_formiga.py',
+}
+mida_maxima = {'cpsat': 500, 'hungarian': 50000, 'generic': 500, 'deap': 500, 'formiga': 5000}
+temps_maxim = 1800
+fitxer_informe = 'benchmark_informe.json'
+fitxer_referencia = 'benchmark_referencia.json'
+guardar_referencia = False
+
+# Tolerància de les regressions: temps i memòria poden créixer fins a un 50% (i els temps, com a mínim 0.5 s,
+# perquè els casos petits són sorollosos); les violacions i les hores sense assignar no poden créixer i un cas
+# correcte no pot fallar
+tolerancia = 0.5
+marge_temps = 0.5
+
+# Pic de memòria resident del procés en MB
+# A Linux i macOS es pren de getrusage (ru_maxrss és en KB a Linux i en bytes a macOS); a Windows, de psutil
+# (peak_wset). Si no es pot mesurar, None, i el cas no es compara en memòria.
+def memoria_pic_mb():
+    if sys.platform == 'win32':
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return round(psutil.Process().memory_info().peak_wset / 2**20, 1)
+    import resource
+    pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(pic / (2**20 if sys.platform == 'darwin' else 2**10), 1)
+
+# Estats dels casos que tenen mesures (temps, memòria i violacions)
+estats_mesurats = ['correcte', 'no_valida']
+
+# Violacions de les restriccions en les assignacions d'un dia, amb la puntuació comuna dels motors
+# (vegeu puntuacio_assignacions.py); hores_sense_assignar és cobertura i no compta al total
+def comptar_violacions(problema, assignacions):
+    df = normalitzar(pd.DataFrame(assignacions), motor='benchmark')
+    puntuacio = puntuar_assignacions(df, problema.posicions, problema.limitacions, problema.treballadors, problema.n_hores)
+    if puntuacio.empty:
+        resultat = dict.fromkeys(violacions + ['total'], 0)
+        resultat['hores_sense_assignar'] = problema.n_treballadors * problema.n_hores
+        resultat['cost'] = resultat['hores_sense_assignar'] * pesos['hores_sense_assignar']
+        return resultat
+    return {nom: int(valor) for nom, valor in puntuacio.iloc[0].items()}
+
+# Resol el primer dia de la instància amb el motor, amb la crida que fa servir el propi motor per a cada dia
+def resoldre_dia(nom_motor, modul, data):
+    if nom_motor == 'generic':
+        return modul.generar_assignacions_genetic(data, modul.treballadors, modul.posicions, modul.limitacions_dict)
+    if nom_motor == 'formiga':
+        return modul.generar_assignacions_dia(pd.Timestamp(data))
+    if nom_motor == 'deap':
+        illes = [modul.toolbox.population(n=modul.mida_illa) for _ in range(modul.n_illes)]
+        illes = modul.evolucionar_dia(illes, modul.ngen_primer_dia)
+        millor = modul.tools.selBest([ind for illa in illes for ind in illa], 1)[0]
+        return modul.generar_assignacions_dia(data, millor)
+    return modul.generar_assignacions_dia(data)
+
+# Un cas del banc de proves (s'executa en un procés a part); posa el resultat a la cua
+def executar_cas(nom_motor, fitxer, cua):
+    random.seed(llavor)
+    np.random.seed(llavor)
+    problema = ProblemaAssignacio.carregar(fitxer)
+    problema_assignacio.problemes_compartits['matí'] = problema
+    problema_assignacio.torn_actiu = 'matí'
+
+    inici = time.perf_counter()
+    fitxer_motor = os.path.join(os.path.dirname(os.path.abspath(__file__)), fitxers_motors[nom_motor])
+    spec = importlib.util.spec_from_file_location(f"motor_{nom_motor}", fitxer_motor)
+    modul = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modul)
+    if nom_motor == 'formiga':
+        modul.n_colonies = 1  # un sol procés: la memòria mesurada és la del cas
+    if nom_motor == 'generic':
+        modul.llavor = llavor  # pygad té els seus propis generadors aleatoris (random_seed)
+    temps_preparacio = time.perf_counter() - inici
+
+    inici = time.perf_counter()
+    estat = 'correcte'
+    try:
+        assignacions = resoldre_dia(nom_motor, modul, problema.dies_laborables[0])
+    except AssignacioNoValida as e:
+        estat, assignacions = 'no_valida', e.assignacions
+    temps_resolucio = time.perf_counter() - inici
+
+    cua.put({
+        'estat': estat,
+        'temps_preparacio': round(temps_preparacio, 3),
+        'temps_resolucio': round(temps_resolucio, 3),
+        'memoria_pic_mb': memoria_pic_mb(),
+        'violacions': comptar_violacions(problema, assignacions),
+    })
+
+def executar_cas_protegit(nom_motor, fitxer, cua):
+    try:
+        executar_cas(nom_motor, fitxer, cua)
+    except Exception as e:
+        cua.put({'estat': 'error', 'error': str(e)})
+
+# Executa un cas en un procés nou i espera el resultat (o l'error, o el temps màxim)
+def mesurar(nom_motor, mida):
+    context = multiprocessing.get_context('spawn')
+    cua = context.Queue()
+    proces = context.Process(target=executar_cas_protegit, args=(nom_motor, fitxer_instancia(mida, llavor), cua))
+    proces.start()
+    proces.join(temps_maxim)
+    if proces.is_alive():
+        proces.terminate()
+        proces.join()
+        return {'estat': 'temps_esgotat'}
+    try:
+        return cua.get(timeout=5)
+    except queue.Empty:
+        return {'estat': 'error', 'error': f"el procés ha acabat amb codi {proces.exitcode}"}
+
+# Regressions d'un resultat respecte al de referència (llista de textos, buida si no n'hi ha)
+# Els casos 'no_valida' també es comparen; passar de 'correcte' a 'no_valida' és una regressió.
+def regressions_cas(resultat, referencia):
+    if referencia.get('estat') not in estats_mesurats:
+        return []
+    if resultat['estat'] not in estats_mesurats:
+        return [f"estat {resultat['estat']} (referència: {referencia['estat']})"]
+    regressions = []
+    if resultat['estat'] == 'no_valida' and referencia['estat'] == 'correcte':
+        regressions.append("estat no_valida (referència: correcte)")
+    for mesura in ['temps_preparacio', 'temps_resolucio']:
+        if resultat[mesura] > referencia[mesura] * (1 + tolerancia) and resultat[mesura] - referencia[mesura] > marge_temps:
+            regressions.append(f"{mesura} {resultat[mesura]:.2f} s (referència: {referencia[mesura]:.2f} s)")
+    if None not in (resultat['memoria_pic_mb'], referencia['memoria_pic_mb']) and \
+            resultat['memoria_pic_mb'] > referencia['memoria_pic_mb'] * (1 + tolerancia):
+        regressions.append(f"memoria_pic_mb {resultat['memoria_pic_mb']} (referència: {referencia['memoria_pic_mb']})")
+    for mesura in ['total', 'hores_sense_assignar']:
+        if resultat['violacions'][mesura] > referencia['violacions'][mesura]:
+            regressions.append(f"violacions {mesura} {resultat['violacions'][mesura]} "
+                               f"(referència: {referencia['violacions'][mesura]})")
+    return regressions
+
+if __name__ == '__main__':
+    informe = {
+        'data': pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'entorn': {'python': platform.python_version(), 'plataforma': platform.platform(), 'nuclis': os.cpu_count()},
+        'llavor': llavor,
+        'resultats': {},
+    }
+    for mida in instancies:
+        for nom_motor in motors:
+            cas = f"{nom_motor}/{mida}"
+            if mides[mida]['n_treballadors'] > mida_maxima[nom_motor]:
+                informe['resultats'][cas] = {'estat': 'omès'}
+                continue
+            resultat = mesurar(nom_motor, mida)
+            informe['resultats'][cas] = resultat
+            if resultat['estat'] in estats_mesurats:
+                marca = '✔️' if resultat['estat'] == 'correcte' else '⚠️'
+                print(f"{marca} {cas} ({resultat['estat']}): {resultat['temps_preparacio']:.2f} s + {resultat['temps_resolucio']:.2f} s, "
+                      f"{resultat['memoria_pic_mb']} MB, {resultat['violacions']['total']} violacions")
+            else:
+                print(f"❌ {cas}: {resultat['estat']} {resultat.get('error') or ''}")
+
+    referencia = {}
+    if os.path.exists(fitxer_referencia):
+        with open(fitxer_referencia, encoding='utf-8') as f:
+            referencia = json.load(f)['resultats']
+    informe['regressions'] = {}
+    for cas, resultat in informe['resultats'].items():
+        regressions = regressions_cas(resultat, referencia.get(cas, {}))
+        if regressions:
+            informe['regressions'][cas] = regressions
+
+    with open(fitxer_informe, 'w', encoding='utf-8') as f:
+        json.dump(informe, f, ensure_ascii=False, indent=2)
+    if guardar_referencia:
+        with open(fitxer_referencia, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, ensure_ascii=False, indent=2)
+        print(f"Referència guardada a {fitxer_referencia}")
+
+    for cas, regressions in informe['regressions'].items():
+        print(f"⚠️ Regressió a {cas}: {'; '.join(regressions)}")
+    if informe['regressions']:
+        sys.exit(1)
@@ -0,0 +1,161 @@
+import io
+import time
+import asyncio
+import threading
+import urllib3
+import numpy as np
+import pandas as pd
+from minio import Minio
+from concurrent.futures import ThreadPoolExecutor
+
+# Memòria cau de les assignacions per al quiosc
+# Cada fitxer de torn (assignacions_<data>_<torn>.csv) es descarrega i s'analitza un sol cop i es guarda indexat:
+# per a cada id_treballador, les seves franges ordenades com a minuts del dia (inici, fi), de manera que trobar
+# l'assignació activa és una consulta a un diccionari i una cerca binària.
+# Un fitxer es considera vigent durant ttl segons; després, la consulta continua responent amb la versió guardada
+# mentre un fil en segon pla comprova l'ETag de l'objecte (i només el torna a descarregar si ha canviat).
+# Només la primera consulta d'un fitxer (o d'un fitxer que no existeix, que es recorda durant ttl_absent) va a MiniO,
+# i les consultes simultànies d'un fitxer que encara no és a la memòria esperen la mateixa descàrrega.
+# Només es guarden els max_entrades fitxers consultats més recentment (el torn actual, el següent precarregat i
+# poc més): els de torns i dies passats es descarten quan se'n carrega un de nou.
+# Una precàrrega que no troba el fitxer no en deixa constància: el fitxer del torn següent encara es pot publicar
+# abans del canvi de torn, i les consultes de després l'han de trobar.
+
+# Minuts del dia de les franges "06:00 - 07:00" (també "6:00" sense final: es compta una hora)
+# Només s'interpreten les etiquetes diferents (unes poques per torn), no cada fila
+def minuts_franges(hores):
+    codis, etiquetes = pd.factorize(hores.astype(str))
+    parts = pd.Series(etiquetes).str.extract(r'^\s*(\d+):(\d+)(?:\s*-\s*(\d+):(\d+))?').astype(float)
+    inici = parts[0] * 60 + parts[1]
+    fi = (parts[2] * 60 + parts[3]).fillna(inici + 60)
+    return inici.to_numpy()[codis], fi.to_numpy()[codis]
+
+class IndexTorn:
+    def __init__(self, df):
+        inici, fi = minuts_franges(df['hora'])
+        ids = df['id_treballador'].to_numpy()
+        ordre = np.lexsort((inici, ids))
+        ordre = ordre[~np.isnan(inici[ordre])]
+        self.inici = inici[ordre]
+        self.fi = fi[ordre]
+        ids = ids[ordre]
+        # Les files es guarden per columnes; el diccionari d'una fila només es crea quan es consulta
+        self.columnes = {columna: df[columna].to_numpy()[ordre] for columna in df.columns}
+        # id_treballador -> (primera fila, última fila + 1) del treballador
+        inicis = np.flatnonzero(np.diff(ids, prepend=np.nan) != 0)
+        finals = np.append(inicis[1:], len(ids))
+        self.rangs = dict(zip(ids[inicis].tolist(), zip(inicis.tolist(), finals.tolist())))
+
+    def te_treballador(self, id_treballador):
+        return id_treballador in self.rangs
+
+    # Fila de l'assignació activa del treballador al minut del dia (la darrera franja que la conté), o None
+    def activa(self, id_treballador, minut):
+        rang = self.rangs.get(id_treballador)
+        if rang is None:
+            return None
+        a, b = rang
+        j = a + int(np.searchsorted(self.inici[a:b], minut, side='right')) - 1
+        if j >= a and self.fi[j] >= minut:
+            return {columna: valors[j] for columna, valors in self.columnes.items()}
+        return None
+
+# Client de MiniO amb un grup de connexions persistents (keep-alive) compartit per tots els fils del quiosc
+# La regió es fixa perquè el client no hagi de preguntar-la al servidor abans de la primera consulta.
+def crear_client(servidor, access_key="minioadmin", secret_key="minioadmin", mida_pool=32, region="us-east-1"):
+    http_client = urllib3.PoolManager(
+        maxsize=mida_pool,
+        timeout=urllib3.Timeout(connect=2, read=10),
+        retries=urllib3.Retry(total=3, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504])
+    )
+    return Minio(servidor, access_key=access_key, secret_key=secret_key, secure=False, region=region,
+                 http_client=http_client)
+
+class CacheAssignacions:
+    def __init__(self, client, bucket, ttl=30, ttl_absent=5, n_fils=4, max_entrades=4):
+        self.client = client
+        self.bucket = bucket
+        self.ttl = ttl
+        self.ttl_absent = ttl_absent
+        self.max_entrades = max_entrades
+        self.entrades = {}  # nom_objecte -> [index (o None si no existeix), etag, moment de validació, darrer ús]
+        self.en_vol = {}  # nom_objecte -> Future de la càrrega o revalidació en curs
+        self.bloqueig = threading.Lock()
+        self.pool = ThreadPoolExecutor(n_fils)
+
+    def descarregar(self, nom_objecte):
+        try:
+            resposta = self.client.get_object(self.bucket, nom_objecte)
+        except Exception:
+            return None, None
+        try:
+            etag = (resposta.headers.get('ETag') or '').strip('"')
+            df = pd.read_csv(io.BytesIO(resposta.read()), encoding='utf-8-sig')
+        finally:
+            resposta.close()
+            resposta.release_conn()
+        return IndexTorn(df), etag
+
+    def etag_actual(self, nom_objecte):
+        try:
+            return self.client.stat_object(self.bucket, nom_objecte).etag.strip('"')
+        except Exception:
+            return None
+
+    # Carrega el fitxer (o el revalida, si ja n'hi ha una entrada) i retorna l'índex
+    # Si MiniO no respon es manté la versió guardada fins a la revalidació següent.
+    # Amb guardar_absent=False, si el fitxer no existeix i no n'hi havia cap entrada, no se'n crea cap.
+    def refrescar(self, nom_objecte, guardar_absent=True):
+        try:
+            entrada = self.entrades.get(nom_objecte)
+            if entrada is not None and entrada[0] is not None and self.etag_actual(nom_objecte) == entrada[1]:
+                index, etag = entrada[0], entrada[1]
+            else:
+                index, etag = self.descarregar(nom_objecte)
+                if index is None and entrada is not None and entrada[0] is not None:
+                    index, etag = entrada[0], entrada[1]
+            if index is None and entrada is None and not guardar_absent:
+                return None
+            ara = time.monotonic()
+            with self.bloqueig:
+                self.entrades[nom_objecte] = [index, etag, ara, entrada[3] if entrada is not None else ara]
+                for nom in sorted(self.entrades, key=lambda nom: self.entrades[nom][3])[:-self.max_entrades]:
+                    del self.entrades[nom]
+            return index
+        finally:
+            with self.bloqueig:
+                self.en_vol.pop(nom_objecte, None)
+
+    # Càrrega en curs del fitxer; si no n'hi ha cap, se'n llança una. Totes les consultes simultànies d'un mateix
+    # fitxer comparteixen la mateixa descàrrega (una sola petició a MiniO per a tot el canvi de torn).
+    def en_curs(self, nom_objecte, guardar_absent=True):
+        with self.bloqueig:
+            futur = self.en_vol.get(nom_objecte)
+            if futur is None:
+                futur = self.en_vol[nom_objecte] = self.pool.submit(self.refrescar, nom_objecte, guardar_absent)
+        return futur
+
+    # (índex, None) si ja hi ha entrada (si ha caducat, es revalida en segon pla); (None, futur) si s'ha d'esperar
+    def preparar(self, nom_objecte, guardar_absent=True):
+        entrada = self.entrades.get(nom_objecte)
+        if entrada is None:
+            return None, self.en_curs(nom_objecte, guardar_absent)
+        ara = entrada[3] = time.monotonic()
+        if ara - entrada[2] > (self.ttl if entrada[0] is not None else self.ttl_absent):
+            self.en_curs(nom_objecte)
+        return entrada[0], None
+
+    # Índex del fitxer (None si no existeix)
+    def obtenir(self, nom_objecte):
+        index, futur = self.preparar(nom_objecte)
+        return futur.result() if futur is not None else index
+
+    # El mateix per als handlers asíncrons: mentre es descarrega el fitxer, el bucle d'esdeveniments continua
+    async def obtenir_async(self, nom_objecte):
+        index, futur = self.preparar(nom_objecte)
+        return await asyncio.wrap_future(futur) if futur is not None else index
+
+    # Comença a carregar el fitxer sense esperar (p. ex. el del torn següent, uns minuts abans del canvi);
+    # si encara no existeix, no es recorda i es torna a provar a la propera precàrrega
+    def precarregar(self, nom_objecte):
+        self.preparar(nom_objecte, guardar_absent=False)
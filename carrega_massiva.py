@@ -0,0 +1,97 @@
+import sqlite3
+from itertools import islice
+
+# Càrrega massiva per als scripts que generen les dades (treballadors, limitacions, posicions, calendari)
+# - Les files s'envien en lots de mida_lot amb executemany (a SQL Server amb fast_executemany de pyodbc,
+#   que envia cada lot com un array de paràmetres en comptes d'una anada i tornada per fila).
+# - Cada taula es buida i es torna a carregar dins d'una sola transacció: si alguna cosa falla, es desfà tot
+#   i la taula queda com estava. Amb transaccio_unica=False es confirma cada lot (per a càrregues enormes
+#   en què no es vol un sol registre de transacció gegant), i llavors la càrrega ja no és atòmica.
+# - Les files poden ser una llista, un generador o un DataFrame; es llegeixen lot a lot, sense materialitzar-les.
+# - Backend 'sqlite' per treballar en local amb un fitxer SQLite amb les mateixes taules.
+username = 'apineda'
+password = 'apineda'
+server = 'ALBA\\SQLEXPRESS'
+database = 'bdapineda2'
+driver = 'ODBC Driver 17 for SQL Server'
+fitxer_sqlite = 'bdapineda2.sqlite'
+
+mida_lot = 10000
+
+def connectar(backend='sqlserver'):
+    if backend == 'sqlite':
+        return sqlite3.connect(fitxer_sqlite)
+    import pyodbc
+    return pyodbc.connect(f'DRIVER={{{driver}}};SERVER={server};DATABASE={database};UID={username};PWD={password}')
+
+def es_sqlite(conn):
+    return isinstance(conn, sqlite3.Connection)
+
+# Crea la taula si no existeix; columnes_sql és la definició de columnes amb la sintaxi de SQL Server
+def crear_taula(conn, taula, columnes_sql):
+    cursor = conn.cursor()
+    if es_sqlite(conn):
+        columnes_sql = columnes_sql.replace('INT IDENTITY(1,1) PRIMARY KEY', 'INTEGER PRIMARY KEY AUTOINCREMENT')
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {taula} ({columnes_sql})")
+    else:
+        cursor.execute(f"""
+IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='{taula}' AND xtype='U')
+CREATE TABLE dbo.{taula} ({columnes_sql})
+""")
+    conn.commit()
+
+# Buida la taula dins de la transacció en curs: TRUNCATE a SQL Server si cap clau forana hi fa referència
+# (TRUNCATE no ho permet), i DELETE en cas contrari o a SQLite
+def buidar_taula(cursor, taula, sqlite):
+    if sqlite:
+        cursor.execute(f"DELETE FROM {taula}")
+        return
+    cursor.execute("SELECT COUNT(*) FROM sys.foreign_keys WHERE referenced_object_id = OBJECT_ID(?)", (taula,))
+    if cursor.fetchone()[0]:
+        cursor.execute(f"DELETE FROM {taula}")
+    else:
+        cursor.execute(f"TRUNCATE TABLE {taula}")
+
+def existeix_taula(cursor, taula, sqlite):
+    if sqlite:
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = ?", (taula,))
+    else:
+        cursor.execute("SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = ?", (taula,))
+    return cursor.fetchone()[0] > 0
+
+def lots(files, mida):
+    if hasattr(files, 'itertuples'):
+        files = files.astype(object).where(files.notna(), None).itertuples(index=False, name=None)
+    files = iter(files)
+    while True:
+        lot = list(islice(files, mida))
+        if not lot:
+            return
+        yield lot
+
+# Buida taula (i abans les taules_dependents, que hi fan referència amb claus foranes) i hi insereix files
+# Retorna el nombre de files inserides.
+def carregar_taula(conn, taula, columnes, files, taules_dependents=(), transaccio_unica=True, mida=None):
+    sqlite = es_sqlite(conn)
+    insert = f"INSERT INTO {taula} ({', '.join(columnes)}) VALUES ({', '.join('?' for _ in columnes)})"
+    cursor = conn.cursor()
+    if not sqlite:
+        cursor.fast_executemany = True
+    n_files = 0
+    try:
+        for dependent in taules_dependents:
+            if existeix_taula(cursor, dependent, sqlite):
+                buidar_taula(cursor, dependent, sqlite)
+        buidar_taula(cursor, taula, sqlite)
+        for lot in lots(files, mida or mida_lot):
+            cursor.executemany(insert, lot)
+            n_files += len(lot)
+            if not transaccio_unica:
+                conn.commit()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return n_files
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+# Atributs que fan que dues posicions siguin equivalents per als solvers
+atributs_equivalencia = ['clasificador', 'familia', 'id_limitacio']
+
+# Compressió de posicions en classes d'equivalència
+# Moltes posicions ("Inducciones mesa 1..N", "Destinos mesa 1..N") tenen el mateix classificador, família i limitació,
+# i per als solvers són intercanviables. Aquesta funció les agrupa en classes, numerades per ordre d'aparició
+# a la taula de posicions, de manera que el resultat és determinista.
+# Retorna un DataFrame amb una fila per classe (atributs d'equivalència i capacitat, és a dir, quantes posicions
+# concretes conté) i una llista amb els índexs de fila de posicions que pertanyen a cada classe.
+def comprimir_posicions(posicions):
+    codis = posicions.groupby(atributs_equivalencia, sort=False, dropna=False).ngroup().to_numpy()
+    ordre = np.argsort(codis, kind='stable')
+    capacitat = np.bincount(codis)
+    membres = np.split(ordre, np.cumsum(capacitat)[:-1])
+
+    primers = [m[0] for m in membres]
+    classes = posicions.iloc[primers][atributs_equivalencia].reset_index(drop=True)
+    classes['capacitat'] = capacitat
+    return classes, membres
+
+# Expansió d'una solució sobre classes a posicions concretes
+# Rep una matriu (n_treballadors, n_hores) d'índexs de classe i retorna la mateixa matriu amb índexs de fila de posicions.
+# Per cada hora, els treballadors que tenen la mateixa classe reben, en ordre de treballador, els membres de la classe
+# un darrere l'altre; si n'hi ha més que la capacitat, es torna a començar pel primer membre.
+# Els índexs de classe fora de rang (assignació buida) es tradueixen a n_posicions, que els solvers ja tracten com a buit.
+def expandir_solucio(solucio, membres, n_posicions):
+    solucio = np.asarray(solucio)
+    n_classes = len(membres)
+    capacitat = np.array([len(m) for m in membres])
+    inici = np.concatenate(([0], np.cumsum(capacitat)[:-1]))
+    membres_concatenats = np.concatenate(membres)
+
+    resultat = np.full(solucio.shape, n_posicions, dtype=np.int64)
+    for h in range(solucio.shape[1]):
+        columna = solucio[:, h]
+        valides = np.flatnonzero((columna >= 0) & (columna < n_classes))
+        classes_valides = columna[valides]
+        ordre = np.argsort(classes_valides, kind='stable')
+        classes_ordenades = classes_valides[ordre]
+        # Rang de cada treballador dins del grup de la seva classe
+        inici_grup = np.searchsorted(classes_ordenades, classes_ordenades, side='left')
+        rang = np.arange(len(ordre)) - inici_grup
+        posicio = membres_concatenats[inici[classes_ordenades] + rang % capacitat[classes_ordenades]]
+        resultat[valides[ordre], h] = posicio
+    return resultat
+
+# Classes factibles per treballador (estil CSR)
+# classes_factibles[indptr[t]:indptr[t+1]] són les classes la limitació de les quals no té el treballador t,
+# en ordre creixent; si no en té cap, se li permeten totes perquè continuï rebent assignació.
+def classes_factibles(classes, ids_treballadors, limitacions_dict):
+    llistes = []
+    for id_treb in ids_treballadors:
+        limitades = classes['id_limitacio'].isin(list(limitacions_dict.get(id_treb, set()))).to_numpy()
+        factibles = np.flatnonzero(~limitades)
+        llistes.append(factibles if len(factibles) else np.arange(len(classes)))
+    indptr = np.concatenate(([0], np.cumsum([len(factibles) for factibles in llistes])))
+    return indptr, np.concatenate(llistes)
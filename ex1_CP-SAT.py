@@ -4,6 +4,10 @@ import os
 from sqlalchemy import create_engine
 from ortools.sat.python import cp_model
 from minio import Minio  # 🔥 NOVA línia: Minio client
+from classes_posicions import expandir_solucio
+from resultats_assignacions import taula_assignacions, guardar_assignacions
+from publicacio_objectes import Publicador, BackendMinio
+from problema_assignacio import carregar_problema
 
 # Connexió SQL Server
 username = 'apineda'
@@ -23,108 +27,107 @@ minio_client = Minio(
 )
 bucket_name = "assignacions-csv"  # Assegura't que existeix a MiniO!
 
-# Carregar dades
-posicions = pd.read_sql("SELECT * FROM posicions", engine)
+# Carregar dades: model del problema compartit amb els altres motors
+# Amb fitxer_problema (p. ex. 'problema_mati.npz'), la primera execució de cada torn i dia el guarda i les següents no consulten la base de dades
+fitxer_problema = None
+problema = carregar_problema(engine, fitxer_problema)
+posicions = problema.posicions
 posicions['clasificador'] = posicions['clasificador'].astype(int)
 posicions['familia'] = posicions['familia'].astype(int)
 posicions['id_limitacio'] = posicions['id_limitacio'].astype(int)
+treballadors = problema.treballadors
+dies_laborables = problema.dies_laborables
 
-treballadors = pd.read_sql("SELECT * FROM treballadors WHERE torn = 'matí'", engine)
-limitacions_df = pd.read_sql("SELECT * FROM treballador_limitacio", engine)
-df_calendari = pd.read_sql("SELECT * FROM calendari_laboral WHERE es_laborable = 1", engine)
-
-# Obtenir els pròxims 7 dies laborables
-avui = pd.Timestamp.today().normalize()
-df_calendari_rename = df_calendari.rename(columns={'aany': 'year', 'numero_mes': 'month', 'numero_dia': 'day'})
-df_calendari['data'] = pd.to_datetime(df_calendari_rename[['year', 'month', 'day']])
-taula_laborables = df_calendari[df_calendari['data'] >= avui].sort_values('data').head(7)
-dies_laborables = taula_laborables['data'].dt.strftime('%Y-%m-%d').tolist()
-
-limitacions_dict = limitacions_df.groupby('id_treballador')['id_limitacio'].apply(set).to_dict()
 output_folder = "assignacions_cpsat"
 os.makedirs(output_folder, exist_ok=True)
 
-# OR-Tools per dia
-def generar_assignacions_dia(data):
+n_treballadors = problema.n_treballadors
+n_hores = problema.n_hores
+n_posicions = problema.n_posicions
+
+# El model treballa sobre classes d'equivalència de posicions per reduir la simetria;
+# la solució s'expandeix a posicions concretes en acabar
+classes, membres_classes = problema.classes, problema.membres_classes
+
+# Arrays precalculats de les classes de posicions
+pos_clasificador = classes['clasificador'].astype(int).tolist()
+pos_familia = classes['familia'].astype(int).tolist()
+
+# OR-Tools: el model es construeix un sol cop per torn i es reutilitza cada dia
+# Les limitacions de cada treballador s'apliquen com a domini de les variables assignacio[(t, h)]:
+# només hi entren les classes de posicions factibles del treballador (les que no tenen cap limitació seva).
+def construir_model():
     model = cp_model.CpModel()
-    n_treballadors = len(treballadors)
-    n_hores = 8
-    n_posicions = len(posicions)
 
     assignacio = {}
     for t in range(n_treballadors):
-        for h in range(n_hores):
-            assignacio[(t, h)] = model.NewIntVar(0, n_posicions - 1, f"treb_{t}_hora_{h}")
+        domini = cp_model.Domain.FromValues(problema.factibles(t).tolist())
 
-    for t in range(n_treballadors):
-        treballador = treballadors.iloc[t]
-        id_treb = treballador['id_treballador']
-        limitacions = limitacions_dict.get(id_treb, set())
+        for h in range(n_hores):
+            assignacio[(t, h)] = model.NewIntVarFromDomain(domini, f"treb_{t}_hora_{h}")
 
         primer_clas = model.NewIntVar(0, 1000, f"clasificador_t{t}")
+        familia = []
         for h in range(n_hores):
-            pos_idx = assignacio[(t, h)]
-            model.AddElement(pos_idx, posicions['clasificador'].tolist(), primer_clas)
+            model.AddElement(assignacio[(t, h)], pos_clasificador, primer_clas)
+            f = model.NewIntVar(0, 1000, f"fam_{t}_{h}")
+            model.AddElement(assignacio[(t, h)], pos_familia, f)
+            familia.append(f)
 
         for h in range(n_hores - 1):
-            f1 = model.NewIntVar(0, 1000, f"fam_{t}_{h}")
-            f2 = model.NewIntVar(0, 1000, f"fam_{t}_{h+1}")
-            model.AddElement(assignacio[(t, h)], posicions['familia'].tolist(), f1)
-            model.AddElement(assignacio[(t, h+1)], posicions['familia'].tolist(), f2)
-            model.Add(f1 != f2)
-
-        if limitacions:
-            for h in range(n_hores):
-                for id_lim in limitacions:
-                    lim_vec = [1 if row['id_limitacio'] == id_lim else 0 for _, row in posicions.iterrows()]
-                    v = model.NewIntVar(0, 1, f"lim_{t}_{h}_{id_lim}")
-                    model.AddElement(assignacio[(t, h)], lim_vec, v)
-                    model.Add(v == 0)
+            model.Add(familia[h] != familia[h + 1])
 
     objectiu = model.NewIntVar(0, 10000, "objectiu")
     model.Maximize(objectiu)
+    return model, assignacio
+
+model, assignacio = construir_model()
 
+# Workers de cerca de CP-SAT per dia (0: els que triï OR-Tools, normalment tots els nuclis).
+# L'executor paral·lel el redueix perquè els dies que es resolen alhora es reparteixin els nuclis.
+n_workers_cpsat = 0
+
+# OR-Tools per dia
+def generar_assignacions_dia(data):
     solver = cp_model.CpSolver()
     solver.parameters.max_time_in_seconds = 30
+    if n_workers_cpsat:
+        solver.parameters.num_workers = n_workers_cpsat
     status = solver.Solve(model)
 
     if status in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
-        assignacions = []
-        for t in range(n_treballadors):
-            treb = treballadors.iloc[t]
-            for h in range(n_hores):
-                idx = solver.Value(assignacio[(t, h)])
-                pos = posicions.iloc[idx]
-                assignacions.append({
-                    'data': data,
-                    'hora': f"{6+h:02d}:00 - {7+h:02d}:00",
-                    'id_treballador': treb['id_treballador'],
-                    'nom': treb['nom'],
-                    'id_posicio': pos['id_posicio'],
-                    'posicio': pos['posicio'],
-                    'clasificador': pos['clasificador'],
-                    'familia': pos['familia']
-                })
-        return pd.DataFrame(assignacions)
+        solucio_classes = np.array([[solver.Value(assignacio[(t, h)]) for h in range(n_hores)] for t in range(n_treballadors)])
+        solucio = expandir_solucio(solucio_classes, membres_classes, n_posicions)
+        return taula_assignacions(solucio, treballadors, posicions, data)
     else:
         print(f"No s'ha trobat cap solució per {data}")
         return pd.DataFrame()
 
-# 🔥 Funció nova: pujar fitxer a MiniO
+# 🔥 Pujar fitxer a MiniO: es posa a la cua del publicador, que el puja en segon pla mentre es resol el dia següent
+# (vegeu publicacio_objectes.py). El publicador el crea el bucle principal; sense publicador no es puja res
+# (execucio_paralela.py publica els fitxers des del seu procés principal).
+publicador = None
+
 def pujar_a_minio(path_local, nom_objecte):
-    minio_client.fput_object(bucket_name, nom_objecte, path_local)
-    print(f"✅ Fitxer pujat a MiniO: {nom_objecte}")
+    if publicador is not None:
+        publicador.publicar(path_local, nom_objecte)
 
-# Executar per cada dia
-for data in dies_laborables:
-    assignacions_dia = generar_assignacions_dia(data)
-    df_dia = pd.DataFrame(assignacions_dia)
-    df_dia = df_dia.sort_values(by=['id_treballador', 'hora'])  # 🔄 Ordenació
+# Generar, guardar i pujar les assignacions d'un dia (també ho fa servir execucio_paralela.py per a cada treball;
+# amb torn, el fitxer porta el torn al nom, com el que llegeix web_gradio.py; a més del CSV es guarda un Parquet
+# particionat, vegeu resultats_assignacions.py)
+def generar_i_guardar_dia(data, torn=None):
+    df_dia = generar_assignacions_dia(data)  # Ja ordenades per treballador i hora
+    output_path = guardar_assignacions(df_dia, output_folder, 'cpsat', data, torn)
 
-    output_path = os.path.join(output_folder, f"assignacions_{data}.csv")
-    df_dia.to_csv(output_path, index=False, encoding='utf-8-sig')
+    # 🔥 NOVETAT: pujar el CSV acabat al bucket (amb la mateixa ruta relativa que el fitxer local)
+    pujar_a_minio(output_path, output_path.replace(os.sep, '/'))
 
-    # 🔥 NOVETAT: pujar el CSV acabat al bucket
-    pujar_a_minio(output_path, f"assignacions_cpsat/assignacions_{data}.csv")
+    print(f"✔️ Assignacions generades per {data}")
+    return output_path
 
-    print(f"✔️ Assignacions generades i pujades per {data}")
+# Executar per cada dia
+# (protegit perquè execucio_paralela.py pugui importar el mòdul)
+if __name__ == '__main__':
+    with Publicador(BackendMinio(minio_client, bucket_name)) as publicador:
+        for data in dies_laborables:
+            generar_i_guardar_dia(data)
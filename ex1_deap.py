@@ -1,9 +1,15 @@
-import pandas as pd
 import random
 from deap import base, creator, tools, algorithms
 import numpy as np
 import os
+import multiprocessing
+from functools import partial
 from sqlalchemy import create_engine
+from classes_posicions import expandir_solucio
+from resultats_assignacions import taula_assignacions, guardar_assignacions
+from publicacio_objectes import Publicador, crear_backend
+from problema_assignacio import carregar_problema
+from fitness_incremental import AvaluadorIncremental, mutacio_per_gens, creuament_un_punt
 
 # Connexió a la base de dades SQL Server
 username = 'apineda'
@@ -14,25 +20,47 @@ driver = 'ODBC Driver 17 for SQL Server'
 connection_url = f'mssql+pyodbc://{username}:{password}@{server}/{database}?driver={driver}'
 engine = create_engine(connection_url)
 
-# Carregar dades
-posicions = pd.read_sql("SELECT * FROM posicions", engine)
-treballadors = pd.read_sql("SELECT * FROM treballadors WHERE torn = 'matí'", engine)
-limitacions_df = pd.read_sql("SELECT * FROM treballador_limitacio", engine)
-df_calendari = pd.read_sql("SELECT * FROM calendari_laboral WHERE es_laborable = 1", engine)
-
-# Generar assignacions per 7 dies laborables
-df_calendari_rename = df_calendari.rename(columns={'aany': 'year', 'numero_mes': 'month', 'numero_dia': 'day'})
-df_calendari['data'] = pd.to_datetime(df_calendari_rename[['year', 'month', 'day']])
-avui = pd.Timestamp.today().normalize()
-taula_laborables = df_calendari[df_calendari['data'] >= avui].sort_values('data').head(7)
-dies_laborables = taula_laborables['data'].dt.strftime('%Y-%m-%d').tolist()
+# Carregar dades: model del problema compartit amb els altres motors
+# Amb fitxer_problema (p. ex. 'problema_mati.npz'), la primera execució de cada torn i dia el guarda i les següents no consulten la base de dades
+# (també els processos de les illes, que tornen a importar el mòdul quan s'inicien amb spawn)
+fitxer_problema = None
+problema = carregar_problema(engine, fitxer_problema)
+posicions = problema.posicions
+treballadors = problema.treballadors
+dies_laborables = problema.dies_laborables
 
 # Carpeta per guardar
 output_folder = 'assignacions_deap'
 os.makedirs(output_folder, exist_ok=True)
 
+# Publicació dels fitxers a MiniO en segon pla mentre es resol el dia següent (vegeu publicacio_objectes.py);
+# desactivada per defecte
+publicar = False
+
+# Classes d'equivalència de posicions: els gens dels individus indexen classes, no posicions concretes
+classes, membres_classes = problema.classes, problema.membres_classes
+
 # Diccionari de limitacions
-limitacions_dict = limitacions_df.groupby('id_treballador')['id_limitacio'].apply(set).to_dict()
+limitacions_dict = problema.limitacions_dict
+
+# Codificació dels individus
+# 'directa': cada gen és un índex de classe de posició
+# 'factible': cada treballador té un gen de classificador i un gen per hora que indexa les classes factibles del
+# treballador amb aquest classificador (vegeu ProblemaAssignacio.descodificar_files); la creació i la mutació
+# només generen valors dins del rang de cada gen i el creuament d'un punt conserva la posició dels gens
+codificacio = 'factible'
+if codificacio == 'factible':
+    gens_fila = 9
+    maxims_gens = problema.maxims_gens
+else:
+    gens_fila = 8
+    maxims_gens = np.full(len(treballadors) * 8, len(classes))
+
+# Traducció dels gens a índexs de classe segons la codificació
+def genes_a_classes(individual):
+    if codificacio == 'factible':
+        return problema.descodificar_gens(individual)
+    return np.array(individual)
 
 # Crear tipus per DEAP
 creator.create("FitnessMax", base.Fitness, weights=(1.0,))
@@ -43,9 +71,9 @@ def fitness(individual):
     fitness_value = 0
     n_treballadors = len(treballadors)
     n_hores = 8
-    n_posicions = len(posicions)
+    n_posicions = len(classes)
 
-    solution = np.array(individual).reshape((n_treballadors, n_hores))
+    solution = genes_a_classes(individual).reshape((n_treballadors, n_hores))
 
     for i, treb in treballadors.iterrows():
         id_treb = treb['id_treballador']
@@ -60,7 +88,7 @@ def fitness(individual):
             if idx_pos >= n_posicions:
                 continue  # Assignació buida
 
-            pos = posicions.iloc[idx_pos]
+            pos = classes.iloc[idx_pos]
 
             # Penalització per limitacions
             if pos['id_limitacio'] in limitacions_treb:
@@ -95,118 +123,144 @@ def fitness(individual):
 
 # Crear individus
 def create_individual():
-    return [random.randint(0, len(posicions) - 1) for _ in range(len(treballadors) * 8)]
+    if codificacio == 'factible':
+        return [random.randrange(maxim) for maxim in maxims_gens.tolist()]
+    return [random.randint(0, len(classes) - 1) for _ in range(len(treballadors) * 8)]
+
+# Mutació d'un gen per a la codificació factible: pren un altre valor dins del rang del gen
+def mutar_gen_factible(individual, i):
+    individual[i] = random.randrange(maxims_gens[i])
+
+# Mutació d'un gen per a la codificació directa (com tools.mutFlipBit)
+def mutar_gen_bit(individual, i):
+    individual[i] = type(individual[i])(not individual[i])
+
+# Puntuació vectoritzada per files (una fila = els gens d'un treballador), amb les mateixes regles que fitness()
+# Les hores fora de rang s'ignoren; la comparació de famílies es fa entre hores vàlides consecutives.
+clas_codis = problema.classe_clasificador
+familia_codis = problema.classe_familia
+
+def puntuar_files(files, treballadors_idx):
+    treballadors_idx = np.asarray(treballadors_idx)
+    n_classes = len(classes)
+    if codificacio == 'factible':
+        files = problema.descodificar_files(files, treballadors_idx)
+    files = np.asarray(files, dtype=np.int64)
+    files = np.where(files < 0, files + n_classes, files)
+    valid = (files >= 0) & (files < n_classes)
+    idx = np.where(valid, files, 0)
+
+    puntuacio = -100 * (problema.te_limitacio(treballadors_idx[:, None], idx) & valid).sum(axis=1)
+
+    # Canvi de classificador respecte de la primera hora vàlida
+    clas = clas_codis[idx]
+    primer = np.take_along_axis(clas, valid.argmax(axis=1)[:, None], axis=1)
+    canvi = (valid & (clas != primer)).any(axis=1)
+    puntuacio += np.where(canvi, -300, 100)
+
+    # Més de dues hores vàlides seguides amb la mateixa família
+    familia = np.where(valid, familia_codis[idx], -1)
+    hores = np.where(valid, np.arange(files.shape[1]), -1)
+    ultima = np.maximum.accumulate(hores, axis=1)
+    anterior = np.full_like(ultima, -1)
+    anterior[:, 1:] = ultima[:, :-1]
+    anterior2 = np.where(anterior >= 0, np.take_along_axis(anterior, np.maximum(anterior, 0), axis=1), -1)
+    fam1 = np.take_along_axis(familia, np.maximum(anterior, 0), axis=1)
+    fam2 = np.take_along_axis(familia, np.maximum(anterior2, 0), axis=1)
+    triples = valid & (anterior2 >= 0) & (familia >= 0) & (familia == fam1) & (fam1 == fam2)
+    puntuacio -= 50 * triples.sum(axis=1)
+    return puntuacio
+
+# Avaluació incremental: només es tornen a puntuar les files que la mutació o el creuament han canviat
+# (l'estat de cada individu hi viatja com a atribut, vegeu fitness_incremental.py)
+avaluador = AvaluadorIncremental(puntuar_files, len(treballadors), gens_fila)
+
+def fitness_incremental(individual):
+    return avaluador.avaluar_individu(individual),
 
 # Toolbox DEAP
 toolbox = base.Toolbox()
 toolbox.register("individual", tools.initIterate, creator.Individual, create_individual)
 toolbox.register("population", tools.initRepeat, list, toolbox.individual)
-toolbox.register("mate", tools.cxOnePoint)
-toolbox.register("mutate", tools.mutFlipBit, indpb=0.2)
+toolbox.register("mate", creuament_un_punt(avaluador))
+if codificacio == 'factible':
+    toolbox.register("mutate", mutacio_per_gens(avaluador, mutar_gen_factible), indpb=0.2)
+else:
+    toolbox.register("mutate", mutacio_per_gens(avaluador, mutar_gen_bit), indpb=0.2)
 toolbox.register("select", tools.selTournament, tournsize=3)
-toolbox.register("evaluate", fitness)
-
-# Crear població
-population = toolbox.population(n=50)
-
-# Executar l'algoritme evolutiu
-algorithms.eaSimple(population, toolbox, cxpb=0.7, mutpb=0.2, ngen=50, verbose=True)
-
-# Millor individu
-best_individual = tools.selBest(population, 1)[0]
-
-# Funció per generar assignacions per un dia concret
+toolbox.register("evaluate", fitness_incremental)
+
+# Model d'illes
+# Cada dia s'evolucionen n_illes subpoblacions en paral·lel (un procés per illa a través de toolbox.map).
+# Cada interval_migracio generacions, els n_migrants millors de cada illa passen a la següent (migració en anell).
+# El primer dia parteix de poblacions aleatòries; els dies següents continuen des de les poblacions finals del dia anterior.
+n_illes = 4
+mida_illa = 50
+ngen_primer_dia = 50
+ngen_dia = 20
+interval_migracio = 10
+n_migrants = 2
+n_processos = n_illes
+
+# Evoluciona una illa ngen generacions (mateix esquema que algorithms.eaSimple) dins del procés que la rep
+def evolucionar_illa(illa, ngen):
+    invalids = [ind for ind in illa if not ind.fitness.valid]
+    for ind, fit in zip(invalids, map(toolbox.evaluate, invalids)):
+        ind.fitness.values = fit
+    for _ in range(ngen):
+        fills = toolbox.select(illa, len(illa))
+        fills = algorithms.varAnd(fills, toolbox, cxpb=0.7, mutpb=0.2)
+        invalids = [ind for ind in fills if not ind.fitness.valid]
+        for ind, fit in zip(invalids, map(toolbox.evaluate, invalids)):
+            ind.fitness.values = fit
+        illa[:] = fills
+    return illa
+
+# Evoluciona totes les illes ngen generacions, en blocs de interval_migracio generacions separats per migracions
+def evolucionar_dia(illes, ngen):
+    fetes = 0
+    while fetes < ngen:
+        bloc = min(interval_migracio, ngen - fetes)
+        illes = list(toolbox.map(partial(evolucionar_illa, ngen=bloc), illes))
+        fetes += bloc
+        tools.migRing(illes, n_migrants, tools.selBest)
+    return illes
+
+# Assignacions d'un dia a partir del millor individu: les classes dels gens s'expandeixen a posicions concretes
+# i la taula es construeix per columnes (vegeu resultats_assignacions.py), ja ordenada per treballador i hora
 def generar_assignacions_dia(data, individu):
-    assignacions = []
-    hores = [f"{h}:00" for h in range(6, 14)]  # De 6:00 a 13:00
-
-    solution = np.array(individu).reshape((len(treballadors), 8))
-
-    for i, treb in treballadors.iterrows():
-        id_treb = treb['id_treballador']
-        nom = treb['nom']
-        limitacions_treb = limitacions_dict.get(id_treb, set())  # 🔥 Agafem limitacions
-
-        # 🔥 Triar classificador fix pel dia
-        primers_idx = [int(idx) for idx in solution[i]]
-        primers_posicions = posicions.iloc[primers_idx]
-        clasificadors = primers_posicions['clasificador'].unique()
-        classificador_dia = random.choice(clasificadors)
-
-        # 🔥 Només posicions amb aquest classificador i sense limitacions
-        posicions_classificador = posicions[
-            (posicions['clasificador'] == classificador_dia) &
-            (~posicions['id_limitacio'].isin(limitacions_treb))  # 🔥 Evitar limitacions
-        ]
-
-        familia_anterior = None  # Control de famílies
-        for h_idx, hora in enumerate(hores):
-            possibles_posicions = posicions_classificador.copy()
-
-            # 🔥 No repetir família
-            if familia_anterior:
-                possibles_posicions = possibles_posicions[posicions_classificador['familia'] != familia_anterior]
-
-            if possibles_posicions.empty:
-                possibles_posicions = posicions_classificador  # Relaxar si no troba (millor això que quedar-se sense assignació)
-
-            if possibles_posicions.empty:
-                # 🔥 No trobem cap posició sense limitacions, posem valor nul.
-                assignacions.append({
-                    'data': data,
-                    'hora': hora,
-                    'id_treballador': id_treb,
-                    'nom': nom,
-                    'posicio': None,
-                    'clasificador': None,
-                    'familia': None
-                })
-                continue
-
-            posicio_aleatoria = possibles_posicions.sample(1).iloc[0]
-
-            assignacions.append({
-                'data': data,
-                'hora': hora,
-                'id_treballador': id_treb,
-                'nom': nom,
-                'posicio': posicio_aleatoria['posicio'],
-                'clasificador': posicio_aleatoria['clasificador'],
-                'familia': posicio_aleatoria['familia']
-            })
-
-            familia_anterior = posicio_aleatoria['familia']
-
-    return assignacions
-
-
-
-
+    solucio_classes = genes_a_classes(individu).reshape((len(treballadors), 8))
+    solucio = expandir_solucio(solucio_classes, membres_classes, len(posicions))
+    return taula_assignacions(solucio, treballadors, posicions, data)
 
 
 # Generar i guardar
-for data in dies_laborables:
-    # Crear una còpia del millor individu
-    individu_dia = creator.Individual(best_individual[:])
-
-    # Aplicar una petita mutació (ex: canviar algunes assignacions aleatòriament)
-    toolbox.mutate(individu_dia)
-    
-    # Assignar el nou individu per al dia
-    assignacions_dia = generar_assignacions_dia(data, individu_dia)
-    
-    df_dia = pd.DataFrame(assignacions_dia)
-
-    # 🔥 Crear columna numèrica per ordenar correctament per hora
-    df_dia['hora_num'] = df_dia['hora'].str.extract(r'(\d+)').astype(int)
-
-    df_dia = df_dia.sort_values(by=['id_treballador', 'hora_num'])
-
-    # ❌ Eliminar columna auxiliar
-    df_dia = df_dia.drop(columns=['hora_num'])
-    
-
-    output_path = os.path.join(output_folder, f"assignacions_{data}.csv")
-    df_dia.to_csv(output_path, index=False, encoding='utf-8-sig')
-    print(f"✔️ Assignacions generades per {data}: {output_path}")
-
+# (protegit perquè els processos de les illes no el tornin a executar en importar el mòdul)
+if __name__ == '__main__':
+    pool = None
+    if n_processos > 1:
+        pool = multiprocessing.Pool(n_processos)
+        toolbox.register("map", pool.map)
+    publicador = Publicador(crear_backend()) if publicar else None
+
+    illes = [toolbox.population(n=mida_illa) for _ in range(n_illes)]
+
+    for i, data in enumerate(dies_laborables):
+        # Evolucionar les illes per al dia, partint de les poblacions del dia anterior
+        illes = evolucionar_dia(illes, ngen_primer_dia if i == 0 else ngen_dia)
+        best_individual = tools.selBest([ind for illa in illes for ind in illa], 1)[0]
+        print(f"Millor fitness per {data}: {best_individual.fitness.values[0]}")
+
+        # Assignar el millor individu per al dia
+        df_dia = generar_assignacions_dia(data, best_individual)
+        output_path = guardar_assignacions(df_dia, output_folder, 'deap', data)
+        if publicador is not None:
+            publicador.publicar(output_path)
+        print(f"✔️ Assignacions generades per {data}: {output_path}")
+
+    if publicador is not None:
+        publicador.tancar()
+
+    if pool is not None:
+        pool.close()
+        pool.join()
@@ -3,6 +3,12 @@ import random
 import pandas as pd
 from sqlalchemy import create_engine
 import os
+from classes_posicions import expandir_solucio
+from resultats_assignacions import taula_assignacions, guardar_assignacions
+from publicacio_objectes import Publicador, crear_backend
+from problema_assignacio import carregar_problema
+import multiprocessing as mp
+from multiprocessing import shared_memory
 
 # Connexió a la base de dades SQL Server
 username = 'apineda'
@@ -13,37 +19,80 @@ driver = 'ODBC Driver 17 for SQL Server'
 connection_url = f'mssql+pyodbc://{username}:{password}@{server}/{database}?driver={driver}'
 engine = create_engine(connection_url)
 
-# Càrrega de les dades
-posicions = pd.read_sql("SELECT * FROM posicions", engine)
-treballadors = pd.read_sql("SELECT * FROM treballadors WHERE torn = 'matí'", engine)
-limitacions_df = pd.read_sql("SELECT * FROM treballador_limitacio", engine)
-df_calendari = pd.read_sql("SELECT * FROM calendari_laboral WHERE es_laborable = 1", engine)
+# Càrrega de les dades: model del problema compartit amb els altres motors
+# Amb fitxer_problema (p. ex. 'problema_mati.npz'), la primera execució de cada torn i dia el guarda i les següents no consulten la base de dades
+# (també els processos de les colònies, que tornen a importar el mòdul quan s'inicien amb spawn)
+fitxer_problema = None
+problema = carregar_problema(engine, fitxer_problema)
+posicions = problema.posicions
+treballadors = problema.treballadors
+limitacions_dict = problema.limitacions_dict
 
 # Processar els 7 propers dies laborables
-df_calendari_rename = df_calendari.rename(columns={'aany': 'year', 'numero_mes': 'month', 'numero_dia': 'day'})
-df_calendari['data'] = pd.to_datetime(df_calendari_rename[['year', 'month', 'day']])
-avui = pd.Timestamp.today().normalize()
-taula_laborables = df_calendari[df_calendari['data'] >= avui].sort_values('data').head(7)
-dies_laborables = taula_laborables['data'].tolist()
+dies_laborables = pd.to_datetime(problema.dies_laborables).tolist()
 
 #crear carpeta per guardar les assignacions
 output_folder = "assignacions_aco"
 os.makedirs(output_folder, exist_ok=True)
 
-# Diccionari de limitacions per treballador
-limitacions_dict = limitacions_df.groupby('id_treballador')['id_limitacio'].apply(set).to_dict()
+# Publicació dels fitxers a MiniO en segon pla mentre es resol el dia següent (vegeu publicacio_objectes.py);
+# desactivada per defecte. execucio_paralela.py publica des del seu procés principal.
+publicar = False
+publicador = None
 
 # Paràmetres de l'ACO
-n_treballadors = len(treballadors)
-n_hores = 8
-n_posicions = len(posicions)
+n_treballadors = problema.n_treballadors
+n_hores = problema.n_hores
+n_posicions = problema.n_posicions
+
+# Les formigues treballen sobre classes d'equivalència de posicions; la solució final s'expandeix a posicions concretes
+classes, membres_classes = problema.classes, problema.membres_classes
+n_classes = problema.n_classes
 n_ants = 10
 n_iter = 10
 evaporacio = 0.5
 intensitat = 1
 
+# Mode d'avaluació: True avalua totes les formigues d'una iteració amb fitness_lot()
+fitness_vectoritzat = True
+
+# Colònies en paral·lel: amb n_colonies > 1 cada colònia s'executa en un procés propi i,
+# cada interval_migracio iteracions, totes reben feromones de la millor solució global (migració elitista)
+n_colonies = 1
+interval_migracio = 5
+
+# Arrays precalculats per a l'avaluació vectoritzada (de ProblemaAssignacio)
+# Els atributs de les classes de posicions es codifiquen com a enters (pd.factorize) perquè comparar codis
+# equival a comparar els valors originals. Els valors nuls queden codificats com a -1.
+pos_clasificador = problema.classe_clasificador
+pos_familia = problema.classe_familia
+
+# Emmagatzematge compacte de feromones (estil CSR)
+# Només es guarden feromones per a les posicions (classes de posicions) factibles de cada treballador (les que no xoquen amb cap limitació).
+# posicions_factibles[indptr[t]:indptr[t+1]] són les posicions factibles del treballador t; si no en té cap,
+# se li permeten totes perquè continuï rebent assignació.
+# El vector de feromones és float32 i té n_hores * nnz elements: el bloc del treballador t comença a n_hores * indptr[t]
+# i dins del bloc hi ha una fila contigua per hora, de manera que la fila (t, h) comença a inici_fila[t, h].
+# posicio_per_index tradueix cada element del vector de feromones a l'índex de classe corresponent.
+llistes_factibles = [problema.factibles(t) for t in range(n_treballadors)]
+grau_factible = np.array([len(factibles) for factibles in llistes_factibles], dtype=np.int64)
+indptr = np.concatenate(([0], np.cumsum(grau_factible)))
+posicions_factibles = np.concatenate(llistes_factibles).astype(np.int32)
+inici_fila = (n_hores * indptr[:-1])[:, None] + np.arange(n_hores) * grau_factible[:, None]
+llargada_fila = np.repeat(grau_factible, n_hores)
+posicio_per_index = np.concatenate([np.tile(factibles, n_hores) for factibles in llistes_factibles]).astype(np.int32)
+
 def reset_feromones():
-    return np.ones((n_treballadors, n_hores, n_posicions))
+    return np.ones(n_hores * indptr[-1], dtype=np.float32)
+
+# Traducció d'una solució (n_treballadors, n_hores) de posicions als índexs del vector de feromones
+# Les posicions factibles de cada treballador estan ordenades, així que la clau t * n_classes + posicio
+# és creixent a tot el vector i un sol np.searchsorted troba la columna de cada gen dins la seva fila.
+claus_factibles = np.repeat(np.arange(n_treballadors), grau_factible) * n_classes + posicions_factibles
+def indexs_de_solucio(solution):
+    claus = np.arange(n_treballadors)[:, None] * n_classes + np.asarray(solution)
+    columna = np.searchsorted(claus_factibles, claus) - indptr[:-1, None]
+    return inici_fila + columna
 
 # Funció de fitness per avaluar la solució
 # La funció de fitness avalua la qualitat d'una solució donada
@@ -65,10 +114,10 @@ def fitness(solution):
 
         for hora in range(n_hores):
             idx_pos = int(solution[i, hora])
-            if idx_pos >= n_posicions:
+            if idx_pos >= n_classes:
                 continue
 
-            pos = posicions.iloc[idx_pos]
+            pos = classes.iloc[idx_pos]
             familia_actual = pos['familia']
             clasificador_actual = pos['clasificador']
             clasificadors_usats.add(clasificador_actual)
@@ -90,16 +139,59 @@ def fitness(solution):
 
     return fitness_value
 
-## Funció per seleccionar una posició basada en el vector de feromones
-# Aquesta funció selecciona una posició aleatòriament basada en la probabilitat proporcional a la quantitat de feromones
-# dipositades en cada posició. Si la suma de les feromones és zero, es selecciona aleatòriament entre totes les posicions.
-# La funció retorna l'índex de la posició seleccionada.
-def seleccionar_posicio(pheromone_vector):
-    posicio_probabilitats = pheromone_vector / np.sum(pheromone_vector)
-    posicio_probabilitats = np.nan_to_num(posicio_probabilitats, nan=0.0)
-    if np.sum(posicio_probabilitats) == 0:
-        posicio_probabilitats = np.ones_like(pheromone_vector) / len(pheromone_vector)
-    return np.random.choice(range(len(pheromone_vector)), p=posicio_probabilitats)
+# Versió vectoritzada de fitness() per a un lot de solucions
+# Rep un array (n_solucions, n_treballadors, n_hores) o una llista de matrius i retorna un array amb el fitness de cada una.
+# Calcula les mateixes penalitzacions que fitness() amb operacions sobre el tensor (formigues x treballadors x hores):
+# les hores amb índex fora de rang s'ignoren i no trenquen la comparació de famílies amb l'hora vàlida anterior.
+def fitness_lot(solutions):
+    solutions = np.asarray(solutions).reshape((-1, n_treballadors, n_hores))
+    valid = solutions < n_classes
+    idx = np.where(valid, solutions, 0)
+
+    # Penalitzacions per limitacions
+    treb_idx = np.arange(n_treballadors)[None, :, None]
+    hits_limitacio = (problema.te_limitacio(treb_idx, idx) & valid).sum(axis=(1, 2))
+
+    # Família de l'última hora vàlida anterior a cada hora
+    familia = pos_familia[idx]
+    hores = np.where(valid, np.arange(n_hores), -1)
+    ultima_valida = np.maximum.accumulate(hores, axis=2)
+    anterior = np.full_like(ultima_valida, -1)
+    anterior[:, :, 1:] = ultima_valida[:, :, :-1]
+    familia_anterior = np.take_along_axis(familia, np.maximum(anterior, 0), axis=2)
+    repeticions = valid & (anterior >= 0) & (familia >= 0) & (familia == familia_anterior)
+    n_repeticions = repeticions.sum(axis=(1, 2))
+    n_canvis = valid.sum(axis=(1, 2)) - n_repeticions
+
+    # Treballadors amb més d'un classificador
+    clasificador = pos_clasificador[idx]
+    clas_max = np.where(valid, clasificador, np.iinfo(clasificador.dtype).min).max(axis=2)
+    clas_min = np.where(valid, clasificador, np.iinfo(clasificador.dtype).max).min(axis=2)
+    multi_clasificador = (valid.any(axis=2) & (clas_max != clas_min)).sum(axis=1)
+
+    return -100 * hits_limitacio - 100 * n_repeticions + 10 * n_canvis - 200 * multi_clasificador
+
+## Funció per seleccionar les posicions de totes les formigues d'una iteració
+# Mostreja de cop totes les posicions (formigues x treballadors x hores) per inversió de la distribució acumulada.
+# Les files de feromones (una per treballador i hora, només amb posicions factibles) ja són contigües al vector compacte,
+# així que un únic vector acumulat i un sol np.searchsorted resolen totes les mostres.
+# Les files sense feromones (suma zero o NaN) es mostregen de manera uniforme entre les posicions factibles.
+# La funció retorna un array (n_ants, n_treballadors, n_hores) amb índexs dins del vector de feromones;
+# posicio_per_index[...] els tradueix a índexs de posició.
+def seleccionar_posicions(feromones, n_ants):
+    pesos = np.nan_to_num(feromones.astype(np.float64), nan=0.0)
+    inici = inici_fila.ravel()
+    totals = np.add.reduceat(pesos, inici)
+    files_buides = totals <= 0
+    if files_buides.any():
+        pesos[np.repeat(files_buides, llargada_fila)] = 1.0
+        totals = np.add.reduceat(pesos, inici)
+    acumulat = np.cumsum(pesos)
+    inici_acumulat = acumulat[inici + llargada_fila - 1] - totals
+    mostres = inici_acumulat + np.random.random((n_ants, len(inici))) * totals
+    index = np.searchsorted(acumulat, mostres, side='right')
+    index = np.clip(index, inici, inici + llargada_fila - 1)
+    return index.reshape((n_ants, n_treballadors, n_hores))
 
 # Funcions per a l'evaporació i actualització de feromones
 # La funció d'evaporació redueix la quantitat de feromones en cada posició en una proporció determinada.
@@ -111,21 +203,20 @@ def seleccionar_posicio(pheromone_vector):
 # La normalització es fa per evitar que les solucions amb fitness molt alt o molt baix afectin excessivament la quantitat de feromones afegides.
 # La normalització es fa restat el fitness mínim i dividint per l'interval de fitness (max_fit - min_fit).
 # Si el fitness màxim i mínim són iguals, es fa servir un valor de 1 per evitar la divisió per zero.
-# La funció d'actualització de feromones recorre totes les solucions generades per les formigues i actualitza la matriu de feromones
-# per cada treballador, hora i posició seleccionada. La quantitat de feromones afegides es multiplica per la intensitat i el fitness normalitzat.
-def evaporar_feromones(pheromone_matrix, evaporacio):
-    pheromone_matrix *= (1 - evaporacio)
-def actualitzar_feromones(pheromone_matrix, ants_solutions, ants_fitness, intensitat):
+# La funció d'actualització de feromones diposita, amb una sola suma per índexs (np.bincount), les feromones de totes les solucions
+# generades per les formigues a cada treballador, hora i posició seleccionada. Rep els índexs dins del vector de feromones
+# retornats per seleccionar_posicions(). La quantitat de feromones afegides es multiplica per la intensitat i el fitness normalitzat.
+def evaporar_feromones(feromones, evaporacio):
+    feromones *= (1 - evaporacio)
+def actualitzar_feromones(feromones, ants_indexs, ants_fitness, intensitat):
     max_fit = max(ants_fitness)
     min_fit = min(ants_fitness)
     fit_range = max_fit - min_fit if max_fit != min_fit else 1
     # Normalitzar el fitness
-    for solution, fitness_value in zip(ants_solutions, ants_fitness):
-        normalized_fit = (fitness_value - min_fit) / fit_range
-        for t in range(n_treballadors):
-            for h in range(n_hores):
-                posicio = int(solution[t, h])
-                pheromone_matrix[t, h, posicio] += intensitat * normalized_fit
+    normalized_fit = (np.asarray(ants_fitness, dtype=float) - min_fit) / fit_range
+    pesos = np.repeat(intensitat * normalized_fit, n_treballadors * n_hores)
+    diposit = np.bincount(np.asarray(ants_indexs).ravel(), weights=pesos, minlength=feromones.size)
+    feromones += diposit.astype(feromones.dtype)
 # Funció principal de l'ACO
 # Aquesta funció és la implementació principal de l'algorisme d'optimització per colònies de formigues (ACO).
 # La funció inicialitza la matriu de feromones i executa un nombre determinat d'iteracions.
@@ -134,70 +225,145 @@ def actualitzar_feromones(pheromone_matrix, ants_solutions, ants_fitness, intens
 # Després de generar les solucions, es realitza l'evaporació de feromones i l'actualització de feromones
 # en funció de les solucions generades i el seu fitness.
 # La funció retorna la millor solució trobada i el seu fitness associat.
-# La matriu de feromones es redimensiona per tenir dimensions (n_treballadors, n_hores, n_posicions).
-def ant_colony_optimization(pheromone_matrix):
+# Les feromones es guarden al vector compacte creat per reset_feromones().
+# Si es passa una funció migrar, es crida cada interval_migracio iteracions amb les feromones i la millor solució de la colònia.
+def ant_colony_optimization(feromones, migrar=None):
     best_solution = None
     best_fitness = float('-inf')
     # Iteracions de l'ACO
     for iteration in range(n_iter):
-        ants_solutions = []
-        ants_fitness = []
-        # Generar solucions per a cada formiga
-        for ant in range(n_ants):
-            solution = np.zeros((n_treballadors, n_hores), dtype=int)
-            # Generar una solució per cada treballador i hora
-            for t in range(n_treballadors):
-                for h in range(n_hores):
-                    pheromone_vector = pheromone_matrix[t, h]
-                    posicio = seleccionar_posicio(pheromone_vector)
-                    solution[t, h] = posicio
-            # Calcular el fitness de la solució generada
-            fitness_value = fitness(solution.flatten())
-            ants_solutions.append(solution)
-            ants_fitness.append(fitness_value)
-            # Actualitzar la millor solució trobada fins ara
+        # Generar de cop les solucions de totes les formigues
+        ants_indexs = seleccionar_posicions(feromones, n_ants)
+        ants_solutions = posicio_per_index[ants_indexs]
+        # Calcular el fitness de les solucions generades
+        if fitness_vectoritzat:
+            ants_fitness = fitness_lot(ants_solutions).tolist()
+        else:
+            ants_fitness = [fitness(solution.flatten()) for solution in ants_solutions]
+        # Actualitzar la millor solució trobada fins ara
+        for solution, fitness_value in zip(ants_solutions, ants_fitness):
             if fitness_value > best_fitness:
                 best_fitness = fitness_value
                 best_solution = solution
         # Evaporar feromones
         # Actualitzar feromones en funció de les solucions generades
-        evaporar_feromones(pheromone_matrix, evaporacio)
-        actualitzar_feromones(pheromone_matrix, ants_solutions, ants_fitness, intensitat)
+        evaporar_feromones(feromones, evaporacio)
+        actualitzar_feromones(feromones, ants_indexs, ants_fitness, intensitat)
+        # Intercanviar la millor solució amb la resta de colònies
+        if migrar is not None and (iteration + 1) % interval_migracio == 0:
+            migrar(feromones, best_solution, best_fitness)
 
     return best_solution, best_fitness
+
+# Colònies en paral·lel amb memòria compartida
+# Totes les colònies comparteixen un únic bloc multiprocessing.shared_memory amb tres arrays:
+# el fitness de la millor solució de cada colònia, els seus índexs al vector de feromones i
+# el vector de feromones de cada colònia. Els processos només reben el nom del bloc, de manera
+# que les feromones no es serialitzen mai; en cada migració només s'escriu la millor solució.
+def vistes_memoria_compartida(buffer, n_colonies):
+    n_feromones = n_hores * int(indptr[-1])
+    millors_fitness = np.ndarray((n_colonies,), dtype=np.float64, buffer=buffer)
+    offset = millors_fitness.nbytes
+    millors_indexs = np.ndarray((n_colonies, n_treballadors, n_hores), dtype=np.int64, buffer=buffer, offset=offset)
+    offset += millors_indexs.nbytes
+    feromones = np.ndarray((n_colonies, n_feromones), dtype=np.float32, buffer=buffer, offset=offset)
+    return millors_fitness, millors_indexs, feromones
+
+def mida_memoria_compartida(n_colonies):
+    n_feromones = n_hores * int(indptr[-1])
+    return n_colonies * (8 + 8 * n_treballadors * n_hores + 4 * n_feromones)
+
+# Procés d'una colònia
+# En cada migració la colònia publica la seva millor solució, espera la resta (barrera) i diposita
+# feromones sobre la millor solució global. La segona espera evita que una colònia sobreescrigui
+# la seva solució abans que les altres l'hagin llegit. Si una colònia falla, la barrera es trenca
+# perquè la resta no es quedi bloquejada.
+def colonia_paralela(nom_memoria, id_colonia, n_colonies, barrera, llavor):
+    np.random.seed(llavor)
+    memoria = shared_memory.SharedMemory(name=nom_memoria)
+    try:
+        millors_fitness, millors_indexs, feromones = vistes_memoria_compartida(memoria.buf, n_colonies)
+        feromones_colonia = feromones[id_colonia]
+        feromones_colonia[:] = 1
+
+        def migrar(feromones, best_solution, best_fitness):
+            millors_indexs[id_colonia] = indexs_de_solucio(best_solution)
+            millors_fitness[id_colonia] = best_fitness
+            barrera.wait()
+            millor = int(np.argmax(millors_fitness))
+            feromones[millors_indexs[millor].ravel()] += intensitat
+            barrera.wait()
+
+        best_solution, best_fitness = ant_colony_optimization(feromones_colonia, migrar)
+        millors_indexs[id_colonia] = indexs_de_solucio(best_solution)
+        millors_fitness[id_colonia] = best_fitness
+        del millors_fitness, millors_indexs, feromones, feromones_colonia
+    except Exception:
+        barrera.abort()
+        raise
+    finally:
+        memoria.close()
+
+# Execució de n_colonies colònies en processos separats
+# La funció retorna la millor solució global entre totes les colònies i el seu fitness.
+def ant_colony_optimization_paralela(n_colonies):
+    memoria = shared_memory.SharedMemory(create=True, size=mida_memoria_compartida(n_colonies))
+    try:
+        millors_fitness, millors_indexs, _ = vistes_memoria_compartida(memoria.buf, n_colonies)
+        millors_fitness[:] = float('-inf')
+        barrera = mp.Barrier(n_colonies)
+        llavors = np.random.randint(0, 2**31 - 1, size=n_colonies)
+        processos = [
+            mp.Process(target=colonia_paralela, args=(memoria.name, c, n_colonies, barrera, int(llavors[c])))
+            for c in range(n_colonies)
+        ]
+        for proces in processos:
+            proces.start()
+        for proces in processos:
+            proces.join()
+        if any(proces.exitcode != 0 for proces in processos):
+            raise RuntimeError("Alguna colònia de l'ACO ha acabat amb error.")
+
+        millor = int(np.argmax(millors_fitness))
+        best_solution = posicio_per_index[millors_indexs[millor]]
+        best_fitness = float(millors_fitness[millor])
+        del millors_fitness, millors_indexs, _
+    finally:
+        memoria.close()
+        memoria.unlink()
+    return best_solution, best_fitness
 ## Funció per generar assignacions d'un dia
 def generar_assignacions_dia(data):
-    pheromone_matrix = reset_feromones()
-    best_solution, _ = ant_colony_optimization(pheromone_matrix)
-    assignacions = []
-    # Generar assignacions per cada treballador i hora
-    # La funció genera assignacions per a cada treballador i hora en un dia determinat.
-    for t in range(n_treballadors):
-        for h in range(n_hores):
-            posicio_idx = best_solution[t, h]
-            if posicio_idx >= n_posicions:
-                continue
-            pos = posicions.iloc[posicio_idx]
-            treballador = treballadors.iloc[t]
-            assignacions.append({
-                'data': data.strftime('%Y-%m-%d'),
-                'id_treballador': treballador['id_treballador'],
-                'nom': treballador['nom'],
-                'hora': f"{6 + h:02d}:00 - {7 + h:02d}:00",
-                'id_posicio': pos['id_posicio'],
-                'posicio': pos['posicio'],
-                'clasificador': pos['clasificador'],
-                'familia': pos['familia']
-            })
-
-    return assignacions
+    if n_colonies > 1:
+        best_solution, _ = ant_colony_optimization_paralela(n_colonies)
+    else:
+        feromones = reset_feromones()
+        best_solution, _ = ant_colony_optimization(feromones)
+    best_solution = expandir_solucio(best_solution, membres_classes, n_posicions)
+    # Assignacions de cada treballador i hora, amb l'ordre de columnes dels CSV d'aquest motor
+    return taula_assignacions(best_solution, treballadors, posicions, data.strftime('%Y-%m-%d'),
+                              columnes=['data', 'id_treballador', 'nom', 'hora', 'id_posicio', 'posicio',
+                                        'clasificador', 'familia'])
 
-# Generar assignacions per cada dia laborable
-for data in dies_laborables:
-    assignacions_dia = generar_assignacions_dia(data)
-    df_dia = pd.DataFrame(assignacions_dia)
-    df_dia = df_dia.sort_values(by=['id_treballador', 'hora'])
-    # Guardar les assignacions en un fitxer CSV
-    output_path = os.path.join(output_folder, f"assignacions_{data.strftime('%Y-%m-%d')}.csv")
-    df_dia.to_csv(output_path, index=False, encoding='utf-8-sig')
+# Generar les assignacions d'un dia i guardar-les en CSV (també ho fa servir execucio_paralela.py per a cada treball;
+# amb torn, el fitxer porta el torn al nom, com el que llegeix web_gradio.py; a més del CSV es guarda un Parquet
+# particionat, vegeu resultats_assignacions.py)
+def generar_i_guardar_dia(data, torn=None):
+    data = pd.Timestamp(data)
+    df_dia = generar_assignacions_dia(data)
+    # Guardar les assignacions (CSV i Parquet)
+    output_path = guardar_assignacions(df_dia, output_folder, 'formiga', data.strftime('%Y-%m-%d'), torn)
+    if publicador is not None:
+        publicador.publicar(output_path)
     print(f"assignacions generades per {data.strftime('%Y-%m-%d')}: {output_path}")
+    return output_path
+
+# Generar assignacions per cada dia laborable
+# (protegit perquè els processos de les colònies no el tornin a executar en importar el mòdul)
+if __name__ == '__main__':
+    if publicar:
+        publicador = Publicador(crear_backend())
+    for data in dies_laborables:
+        generar_i_guardar_dia(data)
+    if publicador is not None:
+        publicador.tancar()
@@ -3,6 +3,11 @@ import numpy as np
 import pygad
 import os
 from sqlalchemy import create_engine
+from classes_posicions import expandir_solucio
+from resultats_assignacions import taula_assignacions, guardar_assignacions, AssignacioNoValida
+from publicacio_objectes import Publicador, crear_backend
+from problema_assignacio import carregar_problema
+from fitness_incremental import AvaluadorIncremental
 
 # CONFIGURACIÓ
 username = 'apineda'
@@ -18,67 +23,146 @@ engine = create_engine(connection_url)
 output_folder = "assignacions_generic"
 os.makedirs(output_folder, exist_ok=True)
 
-# Carregar les dades
-posicions = pd.read_sql("SELECT * FROM posicions", engine)
-treballadors = pd.read_sql("SELECT * FROM treballadors WHERE torn = 'matí'", engine)
-limitacions_df = pd.read_sql("SELECT * FROM treballador_limitacio", engine)
-df_calendari = pd.read_sql("SELECT * FROM calendari_laboral WHERE es_laborable = 1", engine)
-
-# Diccionari de limitacions
-limitacions_dict = limitacions_df.groupby('id_treballador')['id_limitacio'].apply(set).to_dict()
-
-# Dies laborables
-df_calendari_rename = df_calendari.rename(columns={'aany': 'year', 'numero_mes': 'month', 'numero_dia': 'day'})
-df_calendari['data'] = pd.to_datetime(df_calendari_rename[['year', 'month', 'day']])
-avui = pd.Timestamp.today().normalize()
-taula_laborables = df_calendari[df_calendari['data'] >= avui].head(7)
-dies_laborables = taula_laborables['data'].dt.strftime('%Y-%m-%d').tolist()
+# Publicació dels fitxers a MiniO en segon pla mentre es resol el dia següent (vegeu publicacio_objectes.py);
+# desactivada per defecte. execucio_paralela.py publica des del seu procés principal.
+publicar = False
+publicador = None
+
+# Carregar les dades: model del problema compartit amb els altres motors
+# Amb fitxer_problema (p. ex. 'problema_mati.npz'), la primera execució de cada torn i dia el guarda i les següents no consulten la base de dades
+fitxer_problema = None
+problema = carregar_problema(engine, fitxer_problema)
+posicions = problema.posicions
+treballadors = problema.treballadors
+limitacions_dict = problema.limitacions_dict
+dies_laborables = problema.dies_laborables
+
+# Classes d'equivalència de posicions: els gens indexen classes i la solució s'expandeix a posicions concretes
+classes, membres_classes = problema.classes, problema.membres_classes
+
+# Codificació dels cromosomes
+# 'directa': cada gen és un índex de classe de posició (0..n_classes-1)
+# 'factible': cada treballador té un gen de classificador i un gen per hora que indexa les classes factibles del
+# treballador amb aquest classificador (vegeu ProblemaAssignacio.descodificar_files), de manera que la població
+# inicial, la mutació i el creuament no surten mai de l'espai factible (ni de la regla d'un sol classificador)
+codificacio = 'factible'
+
+# Llavor dels generadors aleatoris de pygad (random_seed): amb un valor, les execucions es poden reproduir
+# (cada intent en fa servir una de diferent); amb None, cada execució és diferent
+llavor = None
+
+# ARRAYS PRECALCULATS PER AL FITNESS
+# Són els de ProblemaAssignacio: atributs de les classes codificats com a enters (els valors nuls queden a -1),
+# màscares de bits de limitacions i rang dels gens de la codificació factible.
+n_treballadors_ga = problema.n_treballadors
+n_hores_ga = problema.n_hores
+n_classes = problema.n_classes
+classe_clasificador = problema.classe_clasificador
+classe_familia = problema.classe_familia
+
+# Gens de cada treballador (una fila) i valor màxim (exclòs) de cada gen del cromosoma segons la codificació
+if codificacio == 'factible':
+    gens_fila = n_hores_ga + 1
+    maxims_gens = problema.maxims_gens
+else:
+    gens_fila = n_hores_ga
+    maxims_gens = np.full(n_treballadors_ga * n_hores_ga, n_classes)
+
+# Traducció dels gens a índexs de classe segons la codificació
+def genes_a_classes(genes):
+    if codificacio == 'factible':
+        return problema.descodificar_gens(genes)
+    return np.asarray(genes)
+
+# Espai de valors de cada gen per a pygad: amb la codificació factible, el rang de cada gen
+def espai_gens():
+    if codificacio == 'factible':
+        return [range(maxim) for maxim in maxims_gens]
+    return None
 
 
 # FITNESS FUNCTION
-def fitness_func(ga_instance, solution, solution_idx):
-    n_treballadors = len(treballadors)
-    n_hores = 8
-    n_posicions = len(posicions)
-
-    solution = solution.reshape((n_treballadors, n_hores))
-    fitness = 0
-
-    treballadors_np = treballadors[['id_treballador']].to_numpy().flatten()
-    posicions_np = posicions[['id_limitacio', 'clasificador', 'familia']].to_numpy()
-
-    for i in range(n_treballadors):
-        id_treb = treballadors_np[i]
-        limitacions_treb = limitacions_dict.get(id_treb, set())
-
-        classificadors_usats = set()
-        familia_anterior = None
-        penalitzacio = 0
-
-        for hora in range(n_hores):
-            idx_pos = solution[i, hora]
-            if idx_pos >= n_posicions:
-                familia_anterior = None
-                continue
-
-            pos_info = posicions_np[idx_pos]
-            id_lim, clasificador, familia = pos_info
-
-            if pd.notna(id_lim) and id_lim in limitacions_treb:
-                penalitzacio += 1000
-
-            if familia_anterior is not None and familia_anterior == familia:
-                penalitzacio += 500
-
-            classificadors_usats.add(clasificador)
-            familia_anterior = familia
-
-        if len(classificadors_usats) > 1:
-            penalitzacio += 1000
-
-        fitness += (1000 - penalitzacio)
-
-    return fitness
+# El fitness és la suma d'una puntuació per treballador (una fila de n_hores gens).
+# Per cada fila: +1000, -1000 per cada hora amb una limitació del treballador, -500 per cada hora amb la mateixa
+# família que l'hora anterior (les hores buides tallen la seqüència) i -1000 si fa servir més d'un classificador.
+# Els gens fora de rang són hores buides; els negatius, com en la indexació de numpy, compten des del final.
+def puntuar_files_classes(files, treballadors_idx):
+    files = np.asarray(files, dtype=np.int64)
+    files = np.where(files < 0, files + n_classes, files)
+    valid = (files >= 0) & (files < n_classes)
+    idx = np.where(valid, files, 0)
+
+    hits_limitacio = (problema.te_limitacio(np.asarray(treballadors_idx)[:, None], idx) & valid).sum(axis=1)
+
+    familia = classe_familia[idx]
+    repeticions = valid[:, 1:] & valid[:, :-1] & (familia[:, 1:] >= 0) & (familia[:, 1:] == familia[:, :-1])
+
+    clasificador = classe_clasificador[idx]
+    clas_max = np.where(valid, clasificador, np.iinfo(clasificador.dtype).min).max(axis=1)
+    clas_min = np.where(valid, clasificador, np.iinfo(clasificador.dtype).max).min(axis=1)
+    multi_clasificador = valid.any(axis=1) & (clas_max != clas_min)
+
+    return 1000 - 1000 * hits_limitacio - 500 * repeticions.sum(axis=1) - 1000 * multi_clasificador
+
+# Puntuació per files a partir dels gens (segons la codificació), per a l'avaluador incremental
+def puntuar_files(files, treballadors_idx):
+    if codificacio == 'factible':
+        files = problema.descodificar_files(files, treballadors_idx)
+    return puntuar_files_classes(files, treballadors_idx)
+
+# Avalua tota la població (o un lot d'individus) de cop sobre un tensor (individus x treballadors x hores)
+def avaluar_poblacio(poblacio):
+    poblacio = np.asarray(poblacio, dtype=np.int64).reshape((-1, n_hores_ga))
+    treballadors_idx = np.tile(np.arange(n_treballadors_ga), len(poblacio) // n_treballadors_ga)
+    puntuacions = puntuar_files_classes(poblacio, treballadors_idx)
+    return puntuacions.reshape((-1, n_treballadors_ga)).sum(axis=1)
+
+# Avaluació incremental
+# Amb fitness_incremental = True, el creuament i la mutació registren què han canviat de cada fill
+# i el fitness només torna a puntuar les files (treballadors) afectades.
+fitness_incremental = True
+avaluador = AvaluadorIncremental(puntuar_files, n_treballadors_ga, gens_fila)
+
+# Creuament d'un punt per a pygad (el mateix que crossover_type="single_point": el fill k pren els gens [0, punt)
+# del pare k i la resta del pare k+1) que deriva l'estat de cada fill del dels pares i del punt de tall
+def creuament_incremental(parents, offspring_size, ga_instance):
+    empremtes = [avaluador.empremta(pare) for pare in parents]
+    estats = [avaluador.estat_guardat(empremta) or avaluador.estat_nou() for empremta in empremtes]
+    punts = ga_instance.numpy_random_generator.randint(low=0, high=parents.shape[1], size=offspring_size[0])
+    offspring = np.empty(offspring_size, dtype=parents.dtype)
+    for k, punt in enumerate(punts):
+        pare1, pare2 = k % len(parents), (k + 1) % len(parents)
+        offspring[k, :punt] = parents[pare1, :punt]
+        offspring[k, punt:] = parents[pare2, punt:]
+        avaluador.guardar_estat(avaluador.empremta(offspring[k]), avaluador.creuar_estats(estats[pare1], estats[pare2], punt))
+    return offspring
+
+# Mutació aleatòria per a pygad que registra els gens mutats de cada fill a l'avaluador incremental
+# Muta mutation_num_genes gens per fill i els dona un valor nou dins del rang del gen (maxims_gens).
+# Com el creuament, fa servir els generadors aleatoris de la instància, de manera que random_seed la fa reproduïble.
+def mutacio_incremental(offspring, ga_instance):
+    for fill in offspring:
+        empremta = avaluador.empremta(fill)
+        estat = avaluador.estat_guardat(empremta)
+        # sense permutar tot el cromosoma
+        gens = np.array(ga_instance.python_random_generator.sample(range(len(fill)), ga_instance.mutation_num_genes))
+        anteriors = fill[gens].copy()
+        fill[gens] = ga_instance.numpy_random_generator.randint(0, maxims_gens[gens])
+        if estat is not None:
+            estat = estat.copia()
+            avaluador.marcar_gens(estat, gens)
+            avaluador.guardar_estat(avaluador.empremta_mutada(empremta, gens, anteriors, fill[gens]), estat)
+    return offspring
+
+# Interfície de fitness per lots de pygad (fitness_batch_size): rep un lot d'individus i retorna una llista de valors
+def fitness_func(ga_instance, solutions, solutions_idx):
+    if fitness_incremental:
+        fitness = avaluador.avaluar_lot(np.atleast_2d(solutions))
+    else:
+        fitness = avaluar_poblacio(genes_a_classes(solutions))
+    if np.ndim(solutions) == 1:
+        return fitness[0]
+    return fitness.tolist()
 
 
 # FUNCIÓ PRINCIPAL
@@ -97,13 +181,16 @@ def generar_assignacions_genetic(data, treballadors, posicions, limitacions_dict
             sol_per_pop=40,       # 40 individus
             num_parents_mating=20,
             fitness_func=fitness_func,
-            num_genes=n_treballadors * n_hores,
+            fitness_batch_size=40,  # Tota la població en una sola crida
+            num_genes=n_treballadors * gens_fila,
             gene_type=int,
             init_range_low=0,
-            init_range_high=n_posicions,
+            init_range_high=len(classes),
+            gene_space=espai_gens(),
             mutation_percent_genes=20,
-            mutation_type="random",
-            crossover_type="single_point",
+            mutation_type=mutacio_incremental if fitness_incremental else "random",
+            crossover_type=creuament_incremental if fitness_incremental else "single_point",
+            random_seed=None if llavor is None else llavor + intent,
             suppress_warnings=True
         )
 
@@ -119,37 +206,33 @@ def generar_assignacions_genetic(data, treballadors, posicions, limitacions_dict
         if best_solution_fitness >= 1000 * n_treballadors:
             break
 
-    if best_solution_fitness <= 0:
-        raise Exception(f"No s'ha trobat cap assignació vàlida per {data}.")
-
     # Construir assignacions
-    reshaped = best_solution.reshape((n_treballadors, n_hores))
-    assignacions = []
-    for i, treb in treballadors.iterrows():
-        for hora in range(n_hores):
-            idx_pos = int(reshaped[i, hora])
-            if idx_pos >= n_posicions:
-                continue
-            pos = posicions.iloc[idx_pos]
-            assignacions.append({
-                'data': data,
-                'hora': f"{6+hora:02d}:00 - {7+hora:02d}:00",
-                'id_treballador': treb['id_treballador'],
-                'nom': treb['nom'],
-                'id_posicio': pos['id_posicio'],
-                'posicio': pos['posicio'],
-                'clasificador': pos['clasificador'],
-                'familia': pos['familia']
-            })
+    solucio_classes = genes_a_classes(best_solution).reshape((n_treballadors, n_hores))
+    reshaped = expandir_solucio(solucio_classes, membres_classes, n_posicions)
+    assignacions = taula_assignacions(reshaped, treballadors, posicions, data)
 
+    if best_solution_fitness <= 0:
+        raise AssignacioNoValida(f"No s'ha trobat cap assignació vàlida per {data}.", assignacions)
     return assignacions
 
 
-# BUCLE PER A CADA DIA
-for data in dies_laborables:
-    assignacions_dia = generar_assignacions_genetic(data, treballadors, posicions, limitacions_dict)
-    df_dia = pd.DataFrame(assignacions_dia)
-    df_dia = df_dia.sort_values(by=['id_treballador', 'hora'])
+# ASSIGNACIONS D'UN DIA I CSV (també ho fa servir execucio_paralela.py per a cada treball;
+# amb torn, el fitxer porta el torn al nom, com el que llegeix web_gradio.py; a més del CSV es guarda un Parquet
+# particionat, vegeu resultats_assignacions.py)
+def generar_i_guardar_dia(data, torn=None):
+    df_dia = generar_assignacions_genetic(data, treballadors, posicions, limitacions_dict)
+    output_path = guardar_assignacions(df_dia, output_folder, 'generic', data, torn)
+    if publicador is not None:
+        publicador.publicar(output_path)
+    return output_path
 
-    output_path = os.path.join(output_folder, f"assignacions_{data}.csv")
-    df_dia.to_csv(output_path, index=False, encoding='utf-8-sig')
+
+# BUCLE PER A CADA DIA
+# (protegit perquè execucio_paralela.py pugui importar el mòdul)
+if __name__ == '__main__':
+    if publicar:
+        publicador = Publicador(crear_backend())
+    for data in dies_laborables:
+        generar_i_guardar_dia(data)
+    if publicador is not None:
+        publicador.tancar()
@@ -2,8 +2,15 @@ import pandas as pd
 import numpy as np
 from sqlalchemy import create_engine
 from scipy.optimize import linear_sum_assignment
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
 from datetime import datetime
 import os
+from classes_posicions import expandir_solucio
+from resultats_assignacions import taula_assignacions, guardar_assignacions
+from publicacio_objectes import Publicador, crear_backend
+from assignacio_incremental import AssignadorIncremental
+from problema_assignacio import carregar_problema, bits_comuns
 
 # Connexió a SQL Server amb SQLAlchemy
 username = 'apineda'
@@ -19,117 +26,155 @@ engine = create_engine(connection_url)
 output_folder = "assignacions_hungarian"
 os.makedirs(output_folder, exist_ok=True)
 
-# Obtenir els pròxims 7 dies laborables
-df_calendari = pd.read_sql("SELECT * FROM calendari_laboral WHERE es_laborable = 1", engine)
-avui = pd.Timestamp.today().normalize()
+# Publicació dels fitxers a MiniO en segon pla mentre es resol el dia següent (vegeu publicacio_objectes.py);
+# desactivada per defecte. execucio_paralela.py publica des del seu procés principal.
+publicar = False
+publicador = None
 
-# Renombrar columnes perquè to_datetime les entengui
-df_calendari_rename = df_calendari.rename(columns={'aany': 'year', 'numero_mes': 'month', 'numero_dia': 'day'})
-df_calendari['data'] = pd.to_datetime(df_calendari_rename[['year', 'month', 'day']])
-taula_laborables = df_calendari[df_calendari['data'] >= avui].sort_values('data').head(7)
-dies_laborables = taula_laborables['data'].dt.strftime('%Y-%m-%d').tolist()
-
-# Carreguem les dades
-posicions = pd.read_sql("SELECT * FROM posicions", engine)
-treballadors = pd.read_sql("SELECT * FROM treballadors WHERE torn = 'matí'", engine)
-limitacions_df = pd.read_sql("SELECT * FROM treballador_limitacio", engine)
-
-# Diccionari de limitacions per treballador
-limitacions_dict = limitacions_df.groupby('id_treballador')['id_limitacio'].apply(set).to_dict()
+# Model del problema (posicions, treballadors del torn, limitacions i dies laborables), compartit amb els altres motors
+# Amb fitxer_problema (p. ex. 'problema_mati.npz'), la primera execució de cada torn i dia el guarda i les següents no consulten la base de dades
+fitxer_problema = None
+problema = carregar_problema(engine, fitxer_problema)
+dies_laborables = problema.dies_laborables
+posicions = problema.posicions
+treballadors = problema.treballadors
 
 # Assegurar que la columna 'familia' existeix
 if 'familia' not in posicions.columns:
     raise Exception("La taula 'posicions' ha de tenir una columna 'familia'.")
 
+# Classes d'equivalència de posicions: l'assignació es fa sobre classes i s'expandeix a posicions concretes al final
+classes = problema.classes.copy()
+membres_classes = problema.membres_classes
+classes['classe'] = classes.index
+
+# Codis enters de les classes i màscares de bits per a la factibilitat (precalculats a ProblemaAssignacio)
+classe_clasificador = problema.classe_clasificador
+bit_familia = problema.bit_familia
+bit_limitacio = problema.bit_limitacio
+mascara_limitacions = problema.mascara_limitacions
+
+# Motor d'assignació: 'incremental' reutilitza entre hores (i, amb arrossegar_estat, entre dies) els potencials duals
+# i les parelles encara vàlides (vegeu assignacio_incremental.py); 'scipy' resol cada hora des de zero amb linear_sum_assignment;
+# 'dispers' construeix només les arestes factibles com a graf CSR i resol un aparellament bipartit de pes mínim
+# (per a plantilles grans), tornant a linear_sum_assignment quan la matriu té menys de llindar_dispers cel·les.
+motor_assignacio = 'incremental'
+llindar_dispers = 20000
+assignador = AssignadorIncremental()
+
+# Costos per parella treballador-classe (sempre molt per sota del cost 1000 d'una parella no factible)
+# - rotació: pes_rotacio per cada hora que el treballador ja ha ocupat la classe (en el dia o, amb arrossegar_estat,
+#   en els dies generats abans); per defecte és 0 i les assignacions són les de sempre.
+# - antiguitat: pes_antiguitat * rang d'antiguitat (0 el més antic, 1 el més nou), per prioritzar els més antics
+#   quan falten posicions; per defecte és 0 perquè, si no, els més nous no rebrien mai assignació.
+pes_rotacio = 0.0
+pes_antiguitat = 0.0
+rang_antiguitat = pd.to_datetime(treballadors['data_antiguitat']).rank(pct=True, method='min').fillna(1).to_numpy()
+historial_classes = np.zeros((len(treballadors), len(classes)))
+
+# Estat entre dies: amb arrossegar_estat = True, l'historial de rotació i l'assignador incremental (potencials i
+# parelles) continuen d'un dia al següent. Només té sentit si els dies es resolen en ordre en un sol procés, com fa
+# el bucle d'aquest fitxer; per defecte cada dia comença de zero i no depèn dels dies resolts abans
+# (execucio_paralela.py el deixa sempre desactivat, perquè cada procés només veu alguns dies).
+arrossegar_estat = False
+
+def pesos_parelles(files, classes_parella):
+    return pes_rotacio * historial_classes[files, classes_parella] + pes_antiguitat * rang_antiguitat[files]
+
+# Aparellament dispers: les arestes són les parelles factibles amb pes 1 + cost (scipy descarta els pesos zero).
+# min_weight_full_bipartite_matching exigeix un aparellament complet del costat petit; per garantir que existeix
+# s'afegeixen tants treballadors fictius com posicions, connectats a totes amb pes 1001, i les posicions que
+# acaben amb un treballador fictiu queden buides.
+def aparellament_dispers(fila_arestes, columna_arestes, pesos, n_files, n_columnes):
+    ficticies = np.repeat(np.arange(n_columnes), n_columnes)
+    files = np.concatenate((fila_arestes, n_files + ficticies))
+    columnes = np.concatenate((columna_arestes, np.tile(np.arange(n_columnes), n_columnes)))
+    dades = np.concatenate((1 + pesos, np.full(n_columnes * n_columnes, 1001.0)))
+    graf = csr_matrix((dades, (files, columnes)), shape=(n_files + n_columnes, n_columnes))
+    fila, columna = min_weight_full_bipartite_matching(graf)
+    valides = fila < n_files
+    fila, columna = fila[valides], columna[valides]
+    ordre = np.argsort(fila)
+    return fila[ordre], columna[ordre]
+
 # Funció per generar assignacions per un dia
+# Per cada hora es calcula de cop la matriu booleana treballador x posició de factibilitat (família no usada
+# pel treballador, posició sense cap de les seves limitacions i classificador igual al fixat, si en té) i
+# el motor d'assignació resol directament la matriu rectangular de costos.
 def generar_assignacions_dia(data):
-    assignacions = []
+    global historial_classes, assignador
+    if not arrossegar_estat:
+        historial_classes = np.zeros((len(treballadors), len(classes)))
+        assignador = AssignadorIncremental()
+
     treballadors_disponibles = treballadors.copy()
-    posicions_grup = posicions.copy()
+    posicions_grup = classes.copy()
+    n_treballadors = len(treballadors_disponibles)
+    solucio_classes = np.full((n_treballadors, 8), len(classes))
 
-    # Seguiment de famílies assignades per treballador i classificadors fixats
-    families_assignades = {treb['id_treballador']: set() for _, treb in treballadors_disponibles.iterrows()}
-    clasificadors_fixats = {}
+    # Seguiment de famílies assignades per treballador (màscara de bits) i classificadors fixats (-1 si encara no en té)
+    families_assignades = np.zeros((n_treballadors, bit_familia.shape[1]), dtype=np.uint64)
+    clasificadors_fixats = np.full(n_treballadors, -1, dtype=np.int64)
 
     for hora_offset in range(8):  # De 06:00 a 14:00
-        hora_inici = 6 + hora_offset
-        hora_fi = hora_inici + 1
-        franja_horaria = f"{hora_inici:02d}:00 - {hora_fi:02d}:00"
-
         # Barreja i filtra famílies repetides
-        posicions_hora = posicions_grup.sample(frac=1).drop_duplicates(subset='familia').reset_index(drop=True)
-
-        # Filtra posicions segons classificadors fixats i limitacions
-        posicions_filtrades = []
-        for _, pos in posicions_hora.iterrows():
-            for _, treb in treballadors_disponibles.iterrows():
-                id_treb = treb['id_treballador']
-                limitacions_treb = limitacions_dict.get(id_treb, set())
-                if pos['familia'] not in families_assignades[id_treb] and pos['id_limitacio'] not in limitacions_treb:
-                    clasif_fixe = clasificadors_fixats.get(id_treb)
-                    if clasif_fixe is None or clasif_fixe == pos['clasificador']:
-                        posicions_filtrades.append(pos)
-                        break
-
-        posicions_hora = pd.DataFrame(posicions_filtrades).drop_duplicates(subset='familia')
-
-        n_treballadors = len(treballadors_disponibles)
-        n_posicions = len(posicions_hora)
-        mida = max(n_treballadors, n_posicions)
-
-        cost_matrix = np.full((mida, mida), 1000)
-
-        for i, treb in treballadors_disponibles.iterrows():
-            id_treb = treb['id_treballador']
-            limitacions_treb = limitacions_dict.get(id_treb, set())
-            clasif_fixe = clasificadors_fixats.get(id_treb)
-
-            for j, pos in posicions_hora.iterrows():
-                if pos['familia'] in families_assignades[id_treb]:
-                    continue
-                if pos['id_limitacio'] in limitacions_treb:
-                    continue
-                if clasif_fixe and pos['clasificador'] != clasif_fixe:
-                    continue
-                cost_matrix[i, j] = 0
-
-        fila, columna = linear_sum_assignment(cost_matrix)
-
-        for i, j in zip(fila, columna):
-            if i >= n_treballadors or j >= n_posicions:
-                continue
-            if cost_matrix[i, j] >= 1000:
-                continue
-
-            treb = treballadors_disponibles.iloc[i]
-            pos = posicions_hora.iloc[j]
-            id_treb = treb['id_treballador']
-
-            # Fixar classificador per tot el dia
-            if id_treb not in clasificadors_fixats:
-                clasificadors_fixats[id_treb] = pos['clasificador']
-
-            assignacions.append({
-                'data': data,
-                'hora': franja_horaria,
-                'id_treballador': treb['id_treballador'],
-                'nom': treb['nom'],
-                'id_posicio': pos['id_posicio'],
-                'posicio': pos['posicio'],
-                'clasificador': pos['clasificador'],
-                'familia': pos['familia']
-            })
-
-            families_assignades[id_treb].add(pos['familia'])
-
-    return assignacions
+        classes_hora = posicions_grup.sample(frac=1).drop_duplicates(subset='familia')['classe'].to_numpy()
+
+        # Matriu de factibilitat treballador x posició
+        factible = (
+            ~bits_comuns(families_assignades[:, None], bit_familia[None, classes_hora])
+            & ~bits_comuns(mascara_limitacions[:, None], bit_limitacio[None, classes_hora])
+            & ((clasificadors_fixats[:, None] == -1) | (clasificadors_fixats[:, None] == classe_clasificador[None, classes_hora]))
+        )
+
+        # Només les posicions que algun treballador pot ocupar
+        columnes = factible.any(axis=0)
+        classes_hora = classes_hora[columnes]
+        factible = factible[:, columnes]
+
+        if motor_assignacio == 'dispers' and factible.size >= llindar_dispers:
+            fila_arestes, columna_arestes = np.nonzero(factible)
+            pesos = pesos_parelles(fila_arestes, classes_hora[columna_arestes])
+            fila, columna = aparellament_dispers(fila_arestes, columna_arestes, pesos, n_treballadors, len(classes_hora))
+        else:
+            cost_matrix = np.where(factible, pesos_parelles(np.arange(n_treballadors)[:, None], classes_hora[None, :]), 1000)
+            if motor_assignacio == 'incremental':
+                fila, columna = assignador.resoldre(cost_matrix, treballadors_disponibles['id_treballador'], classes_hora)
+            else:
+                fila, columna = linear_sum_assignment(cost_matrix)
+            valides = cost_matrix[fila, columna] < 1000
+            fila, columna = fila[valides], columna[valides]
+        classe = classes_hora[columna]
+
+        # Fixar classificador per tot el dia
+        sense_fixar = clasificadors_fixats[fila] == -1
+        clasificadors_fixats[fila[sense_fixar]] = classe_clasificador[classe[sense_fixar]]
+
+        solucio_classes[fila, hora_offset] = classe
+        families_assignades[fila] |= bit_familia[classe]
+        historial_classes[fila, classe] += 1
+
+    # Expandir les classes assignades a posicions concretes
+    solucio = expandir_solucio(solucio_classes, membres_classes, len(posicions))
+    return taula_assignacions(solucio, treballadors_disponibles, posicions, data)
+
+# Generar les assignacions d'un dia i guardar-les en CSV (també ho fa servir execucio_paralela.py per a cada treball;
+# amb torn, el fitxer porta el torn al nom, com el que llegeix web_gradio.py; a més del CSV es guarda un Parquet
+# particionat, vegeu resultats_assignacions.py)
+def generar_i_guardar_dia(data, torn=None):
+    df_dia = generar_assignacions_dia(data)  # Ja ordenades per treballador i hora
+    output_path = guardar_assignacions(df_dia, output_folder, 'hungarian', data, torn)
+    if publicador is not None:
+        publicador.publicar(output_path)
+    print(f"✔️ Assignacions generades per {data}: {output_path}")
+    return output_path
 
 # 🔁 Generar assignacions per cada dia i guardar CSV
-for data in dies_laborables:
-    assignacions_dia = generar_assignacions_dia(data)
-    df_dia = pd.DataFrame(assignacions_dia)
-    df_dia = df_dia.sort_values(by=['id_treballador', 'hora'])  # 🔄 Ordenació
-
-    output_path = os.path.join(output_folder, f"assignacions_{data}.csv")
-    df_dia.to_csv(output_path, index=False, encoding='utf-8-sig')
-    print(f"✔️ Assignacions generades per {data}: {output_path}")
+# (protegit perquè execucio_paralela.py pugui importar el mòdul)
+if __name__ == '__main__':
+    if publicar:
+        publicador = Publicador(crear_backend())
+    for data in dies_laborables:
+        generar_i_guardar_dia(data)
+    if publicador is not None:
+        publicador.tancar()
@@ -0,0 +1,116 @@
+import os
+import time
+import importlib.util
+import multiprocessing
+from sqlalchemy import create_engine
+import problema_assignacio
+from problema_assignacio import ProblemaAssignacio, carregar_problema
+from publicacio_objectes import Publicador, crear_backend
+
+# Execució en paral·lel dels motors per dia i torn
+# Cada treball (torn, dia) es resol en un procés d'un multiprocessing.Pool i el seu CSV s'escriu en acabar,
+# de manera que una setmana tarda aproximadament el que tarda el dia més lent.
+# Els models de cada torn (ProblemaAssignacio) es carreguen un sol cop al procés principal i els seus arrays
+# es copien a memòria compartida; els processos només reben el descriptor en iniciar-se, no en cada treball.
+# ex1_deap.py no hi és: els seus dies depenen de les poblacions del dia anterior i ja paral·lelitza per illes.
+# Per la mateixa raó, ex4_hungarian.py s'executa sense arrossegar estat entre dies (historial de rotació i
+# arrencada en calent): cada dia es resol com si fos el primer, i el resultat no depèn del procés que el resol.
+
+# Connexió a la base de dades SQL Server
+username = 'apineda'
+password = 'apineda'
+server = 'ALBA\\SQLEXPRESS'
+database = 'bdapineda2'
+driver = 'ODBC Driver 17 for SQL Server'
+connection_url = f'mssql+pyodbc://{username}:{password}@{server}/{database}?driver={driver}'
+
+# Configuració
+motor = 'cpsat'
+torns = ['matí', 'tarda', 'nit']
+n_processos = None  # None: un per treball, fins al nombre de nuclis
+# Els fitxers acabats es publiquen a MiniO des d'aquest procés, en segon pla, mentre els processos resolen
+# els treballs següents (vegeu publicacio_objectes.py); backend_publicacio = 'fitxers' per provar sense servidor
+publicar = True
+backend_publicacio = 'minio'
+fitxers_motors = {
+    'cpsat': 'ex1_CP-SAT.py',
+    'hungarian': 'ex4_hungarian.py',
+    'generic': 'ex1_generic.py',
+    'formiga': 'ex1_formiga.py',
+}
+
+# Estat de cada procés del pool: models per torn i motors ja importats per (motor, torn)
+moduls = {}
+workers_cpsat = 0
+
+def inicialitzar_proces(descriptors, n_workers_cpsat):
+    global workers_cpsat
+    for torn, descriptor in descriptors.items():
+        problema_assignacio.problemes_compartits[torn] = ProblemaAssignacio.des_de_memoria_compartida(descriptor)
+    workers_cpsat = n_workers_cpsat
+
+# Importa el motor per a un torn: mentre s'executa el mòdul, carregar_problema() retorna el model compartit del torn
+def carregar_motor(nom_motor, torn):
+    if (nom_motor, torn) not in moduls:
+        fitxer = os.path.join(os.path.dirname(os.path.abspath(__file__)), fitxers_motors[nom_motor])
+        spec = importlib.util.spec_from_file_location(f"motor_{nom_motor}_{len(moduls)}", fitxer)
+        modul = importlib.util.module_from_spec(spec)
+        problema_assignacio.torn_actiu = torn
+        try:
+            spec.loader.exec_module(modul)
+        finally:
+            problema_assignacio.torn_actiu = None
+        if nom_motor == 'cpsat':
+            modul.n_workers_cpsat = workers_cpsat
+        if nom_motor == 'formiga':
+            modul.n_colonies = 1  # els processos del pool no poden crear processos de colònies
+        if nom_motor == 'hungarian':
+            modul.arrossegar_estat = False  # cada procés només resol alguns dels dies
+        moduls[(nom_motor, torn)] = modul
+    return moduls[(nom_motor, torn)]
+
+# Un treball: resoldre i guardar un dia d'un torn. Retorna el treball, el fitxer (o l'error) i el temps.
+def executar_treball(treball):
+    nom_motor, torn, data = treball
+    inici = time.time()
+    try:
+        output_path = carregar_motor(nom_motor, torn).generar_i_guardar_dia(data, torn)
+        return treball, output_path, None, time.time() - inici
+    except Exception as e:
+        return treball, None, str(e), time.time() - inici
+
+if __name__ == '__main__':
+    engine = create_engine(connection_url)
+    problemes = {torn: carregar_problema(engine, torn=torn) for torn in torns}
+
+    memories = []
+    descriptors = {}
+    publicador = Publicador(crear_backend(backend_publicacio)) if publicar else None
+    try:
+        for torn, problema in problemes.items():
+            memoria, descriptor = problema.a_memoria_compartida()
+            memories.append(memoria)
+            descriptors[torn] = descriptor
+
+        treballs = [(motor, torn, data) for torn in torns for data in problemes[torn].dies_laborables]
+        processos = n_processos or max(1, min(len(treballs), os.cpu_count()))
+        # Repartiment de nuclis amb CP-SAT: cada dia que es resol alhora rep la seva part dels workers de cerca
+        n_workers_cpsat = max(1, os.cpu_count() // processos)
+
+        inici = time.time()
+        with multiprocessing.Pool(processos, initializer=inicialitzar_proces,
+                                  initargs=(descriptors, n_workers_cpsat)) as pool:
+            for (nom_motor, torn, data), output_path, error, durada in pool.imap_unordered(executar_treball, treballs):
+                if error:
+                    print(f"❌ {nom_motor} {torn} {data}: {error} ({durada:.1f} s)")
+                else:
+                    print(f"✔️ {nom_motor} {torn} {data}: {output_path} ({durada:.1f} s)")
+                    if publicador is not None:
+                        publicador.publicar(output_path)
+        print(f"{len(treballs)} treballs en {time.time() - inici:.1f} s amb {processos} processos")
+    finally:
+        if publicador is not None:
+            publicador.tancar()
+        for memoria in memories:
+            memoria.close()
+            memoria.unlink()
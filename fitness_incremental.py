@@ -0,0 +1,152 @@
+import random
+import numpy as np
+
+# Avaluació incremental del fitness
+# El fitness de tots els motors és una suma de termes per treballador (una fila de n_hores gens per treballador).
+# Cada cromosoma avaluat té un EstatFitness: la puntuació de cada fila, el total (la suma) i quines files estan
+# pendents de tornar a puntuar. Els operadors genètics registren directament què han canviat:
+#   - la mutació, els índexs dels gens mutats (les seves files queden pendents),
+#   - el creuament d'un punt, el punt de tall (les files de cada costat hereten la puntuació del pare corresponent
+#     i només la fila tallada queda pendent).
+# En avaluar, només es puntuen les files pendents, en una sola crida a puntuar_files per a tot el lot, i el total
+# s'actualitza amb la diferència. Un cromosoma que no té estat es puntua sencer.
+# On es guarda l'estat:
+#   - DEAP: a l'individu mateix (atribut estat_fitness), de manera que la memòria va amb la població;
+#   - pygad (els cromosomes són files d'un array): en una memòria cau indexada per l'empremta del cromosoma
+#     (un hash de 64 bits lineal en els gens, que la mutació actualitza sense recórrer el cromosoma),
+#     limitada a max_memoria bytes; quan s'omple, es descarten els estats usats fa més temps.
+#
+# puntuar_files(files, treballadors_idx) rep un array (k, n_hores) de gens i l'índex del treballador de cada fila,
+# i retorna un array (k,) amb la puntuació de cada fila.
+class EstatFitness:
+    __slots__ = ('puntuacions', 'pendents', 'total')
+
+    def __init__(self, puntuacions, pendents, total):
+        self.puntuacions = puntuacions
+        self.pendents = pendents
+        self.total = total
+
+    def copia(self):
+        return EstatFitness(self.puntuacions.copy(), self.pendents.copy(), self.total)
+
+class AvaluadorIncremental:
+    def __init__(self, puntuar_files, n_treballadors, n_hores, max_memoria=256 * 2**20):
+        self.puntuar_files = puntuar_files
+        self.n_treballadors = n_treballadors
+        self.n_hores = n_hores
+        self.max_memoria = max_memoria
+        self.mida_estat = n_treballadors * 9  # float64 de puntuació + bool de pendent per fila
+        self.estats = {}  # empremta -> EstatFitness (només per a pygad), del més antic al més recent
+        self.files_recalculades = 0
+        rng = np.random.default_rng(0)
+        self.pesos = np.frombuffer(rng.bytes(8 * n_treballadors * n_hores), dtype=np.uint64) | np.uint64(1)
+
+    def estat_nou(self):
+        return EstatFitness(np.zeros(self.n_treballadors), np.ones(self.n_treballadors, dtype=bool), 0.0)
+
+    # Marca com a pendents les files dels gens canviats (l'estat es modifica)
+    def marcar_gens(self, estat, gens):
+        estat.pendents[np.asarray(gens, dtype=np.int64) // self.n_hores] = True
+
+    # Estat del fill que pren els gens [0, punt) de estat1 i els gens [punt, final) de estat2
+    def creuar_estats(self, estat1, estat2, punt):
+        fila = punt // self.n_hores
+        puntuacions = np.concatenate((estat1.puntuacions[:fila], estat2.puntuacions[fila:]))
+        pendents = np.concatenate((estat1.pendents[:fila], estat2.pendents[fila:]))
+        if punt % self.n_hores:
+            pendents[fila] = True
+        return EstatFitness(puntuacions, pendents, float(puntuacions.sum()))
+
+    def _files(self, cromosoma, files):
+        if isinstance(cromosoma, np.ndarray) or 4 * len(files) > self.n_treballadors:
+            return np.asarray(cromosoma, dtype=np.int64).reshape((self.n_treballadors, self.n_hores))[files]
+        h = self.n_hores
+        return np.array([cromosoma[t * h:(t + 1) * h] for t in files.tolist()], dtype=np.int64).reshape((-1, h))
+
+    # Puntua les files pendents de tots els estats en una sola crida i en retorna els totals
+    def avaluar_estats(self, estats, cromosomes):
+        pendents = [np.flatnonzero(estat.pendents) for estat in estats]
+        if sum(len(files) for files in pendents):
+            noves = self.puntuar_files(
+                np.concatenate([self._files(cromosoma, files) for cromosoma, files in zip(cromosomes, pendents)]),
+                np.concatenate(pendents))
+            inici = 0
+            for estat, files in zip(estats, pendents):
+                valors = noves[inici:inici + len(files)]
+                inici += len(files)
+                estat.total += float((valors - estat.puntuacions[files]).sum())
+                estat.puntuacions[files] = valors
+                estat.pendents[files] = False
+            self.files_recalculades += inici
+        return np.array([estat.total for estat in estats])
+
+    # DEAP: l'estat viatja amb l'individu (toolbox.clone el copia)
+    def estat_individu(self, individual):
+        estat = getattr(individual, 'estat_fitness', None)
+        if estat is None:
+            estat = individual.estat_fitness = self.estat_nou()
+        return estat
+
+    def avaluar_individu(self, individual):
+        return self.avaluar_estats([self.estat_individu(individual)], [individual])[0]
+
+    # pygad: empremta del cromosoma, suma de pesos[i] * gen_i mòdul 2**64
+    def empremta(self, cromosoma):
+        gens = np.ascontiguousarray(cromosoma, dtype=np.int64)
+        return int(np.dot(gens.view(np.uint64), self.pesos))
+
+    # Empremta després de canviar els gens de valors anteriors a valors nous, sense recórrer el cromosoma
+    def empremta_mutada(self, empremta, gens, anteriors, nous):
+        diferencia = np.asarray(nous).astype(np.int64).view(np.uint64) - np.asarray(anteriors).astype(np.int64).view(np.uint64)
+        return (empremta + int((diferencia * self.pesos[gens]).sum(dtype=np.uint64))) % 2**64
+
+    def estat_guardat(self, empremta):
+        estat = self.estats.pop(empremta, None)
+        if estat is not None:
+            self.estats[empremta] = estat
+        return estat
+
+    def guardar_estat(self, empremta, estat):
+        self.estats.pop(empremta, None)
+        self.estats[empremta] = estat
+        maxim = max(1, self.max_memoria // self.mida_estat)
+        while len(self.estats) > maxim:
+            del self.estats[next(iter(self.estats))]
+
+    # Avalua un lot de cromosomes (files d'un array); els que no tenen estat guardat es puntuen sencers
+    def avaluar_lot(self, cromosomes):
+        empremtes = [self.empremta(cromosoma) for cromosoma in cromosomes]
+        estats = [self.estat_guardat(empremta) or self.estat_nou() for empremta in empremtes]
+        totals = self.avaluar_estats(estats, cromosomes)
+        for empremta, estat in zip(empremtes, estats):
+            self.guardar_estat(empremta, estat)
+        return totals
+
+    def avaluar(self, cromosoma):
+        return self.avaluar_lot([cromosoma])[0]
+
+# Els operadors de DEAP treuen els nombres aleatoris de rng (per defecte el mòdul random, el que fa servir DEAP),
+# de manera que random.seed (o un random.Random propi) fa reproduïble tota l'evolució.
+
+# Mutació de DEAP gen a gen: cada gen, amb probabilitat indpb, canvia amb mutar_gen(individual, i);
+# les files dels gens triats queden pendents a l'estat de l'individu
+# (els gens es trien amb un generador de numpy inicialitzat des de rng, sense recórrer el cromosoma en Python)
+def mutacio_per_gens(avaluador, mutar_gen, rng=random):
+    def mutar(individual, indpb):
+        gens = np.flatnonzero(np.random.default_rng(rng.getrandbits(64)).random(len(individual)) < indpb)
+        for i in gens.tolist():
+            mutar_gen(individual, i)
+        avaluador.marcar_gens(avaluador.estat_individu(individual), gens)
+        return individual,
+    return mutar
+
+# Creuament d'un punt de DEAP (com tools.cxOnePoint) que deriva l'estat dels fills del punt de tall
+def creuament_un_punt(avaluador, rng=random):
+    def creuar(ind1, ind2):
+        punt = rng.randint(1, min(len(ind1), len(ind2)) - 1)
+        estat1, estat2 = avaluador.estat_individu(ind1), avaluador.estat_individu(ind2)
+        ind1[punt:], ind2[punt:] = ind2[punt:], ind1[punt:]
+        ind1.estat_fitness = avaluador.creuar_estats(estat1, estat2, punt)
+        ind2.estat_fitness = avaluador.creuar_estats(estat2, estat1, punt)
+        return ind1, ind2
+    return creuar
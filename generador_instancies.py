@@ -0,0 +1,63 @@
+import os
+import numpy as np
+import pandas as pd
+from problema_assignacio import ProblemaAssignacio
+
+# Generador d'instàncies sintètiques
+# Crea, sense base de dades, un ProblemaAssignacio reproduïble (mateixa llavor, mateixa instància) amb:
+#   - n_posicions posicions amb classificador, família i limitació aleatoris; id_limitacio 0 vol dir
+#     que la posició no té cap limitació (com a posicions.csv),
+#   - n_treballadors treballadors (tots del torn de la instància) amb una data d'antiguitat aleatòria,
+#   - per a cada treballador i cada limitació 1..n_limitacions, la limitació amb probabilitat densitat_limitacions,
+#   - n_dies dies laborables (de dilluns a divendres) a partir de data_inici.
+# La instància es pot guardar en .npz (ProblemaAssignacio.guardar) i es passa als motors amb problemes_compartits,
+# com fa benchmark.py.
+
+# Mides predefinides (la petita reprodueix les proporcions de posicions.csv i treballadors.csv)
+mides = {
+    'petita': dict(n_treballadors=50, n_posicions=95, n_clasificadors=4, n_families=9, densitat_limitacions=0.15),
+    'mitjana': dict(n_treballadors=500, n_posicions=400, n_clasificadors=4, n_families=9, densitat_limitacions=0.15),
+    'gran': dict(n_treballadors=5000, n_posicions=2000, n_clasificadors=6, n_families=12, densitat_limitacions=0.15),
+    'molt_gran': dict(n_treballadors=50000, n_posicions=10000, n_clasificadors=8, n_families=16, densitat_limitacions=0.15),
+}
+carpeta_instancies = 'instancies'
+
+def generar_instancia(n_treballadors, n_posicions, n_clasificadors, n_families, densitat_limitacions,
+                      n_limitacions=9, n_dies=7, data_inici='2025-01-06', llavor=0):
+    rng = np.random.default_rng(llavor)
+
+    ids_posicions = np.arange(1, n_posicions + 1)
+    posicions = pd.DataFrame({
+        'id_posicio': ids_posicions,
+        'posicio': [f"Posició {i}" for i in ids_posicions],
+        'clasificador': rng.integers(1, n_clasificadors + 1, n_posicions),
+        'id_limitacio': rng.integers(0, n_limitacions + 1, n_posicions),
+        'familia': rng.integers(1, n_families + 1, n_posicions),
+    })
+
+    ids_treballadors = np.arange(1, n_treballadors + 1)
+    antiguitat = pd.Timestamp('2000-01-01') + pd.to_timedelta(rng.integers(0, 25 * 365, n_treballadors), unit='D')
+    treballadors = pd.DataFrame({
+        'id_treballador': ids_treballadors,
+        'nom': [f"Treballador {i}" for i in ids_treballadors],
+        'data_antiguitat': antiguitat.strftime('%Y-%m-%d'),
+    })
+
+    te_limitacio = rng.random((n_treballadors, n_limitacions)) < densitat_limitacions
+    fila, columna = np.nonzero(te_limitacio)
+    limitacions_df = pd.DataFrame({'id_treballador': ids_treballadors[fila], 'id_limitacio': columna + 1})
+
+    dies_laborables = pd.bdate_range(data_inici, periods=n_dies).strftime('%Y-%m-%d').tolist()
+    return ProblemaAssignacio(posicions, treballadors, limitacions_df, dies_laborables)
+
+# Genera (si no existeix) i guarda la instància d'una mida predefinida; retorna la ruta del fitxer .npz
+def fitxer_instancia(mida, llavor=0):
+    fitxer = os.path.join(carpeta_instancies, f"{mida}_{llavor}.npz")
+    if not os.path.exists(fitxer):
+        os.makedirs(carpeta_instancies, exist_ok=True)
+        generar_instancia(**mides[mida], llavor=llavor).guardar(fitxer)
+    return fitxer
+
+if __name__ == '__main__':
+    for mida in mides:
+        print(f"✔️ Instància {mida}: {fitxer_instancia(mida)}")
@@ -1,17 +1,11 @@
 import pandas as pd
-import pyodbc
+from carrega_massiva import connectar, crear_taula, carregar_taula
 
-# Connexió a la base de dades
-username = 'apineda'
-password = 'apineda'
-server = 'ALBA\\SQLEXPRESS'
-database = 'bdapineda2'
-driver = 'ODBC Driver 17 for SQL Server'
+# Backend: 'sqlserver' o 'sqlite' (fitxer local, vegeu carrega_massiva.py)
+backend = 'sqlserver'
 
-conn = pyodbc.connect(
-    f'DRIVER={{SQL Server}};SERVER={server};DATABASE={database};UID={username};PWD={password}'
-)
-cursor = conn.cursor()
+# Connexió a la base de dades
+conn = connectar(backend)
 
 # Llegir els CSV
 df_limitacions = pd.read_csv("limit.csv")
@@ -19,53 +13,37 @@ df_posicions = pd.read_csv("posicions.csv")
 
 ### --- LIMITACIONS --- ###
 # Comprovar si existeix la taula 'limitacions'
-cursor.execute("""
-IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='limitacions' AND xtype='U')
-               CREATE TABLE dbo.limitacions (
+crear_taula(conn, 'limitacions', """
                 id_limitacio int PRIMARY KEY,
                 limitacio nvarchar(50),
                 seccio nvarchar(50)
-)
 """)
-conn.commit()
 
 print(df_limitacions)
 
-# Inserir dades de limitacions
-insert_limitacions = """
-INSERT INTO limitacions (id_limitacio, limitacio, seccio)
-VALUES (?, ?, ?)
-"""
-cursor.executemany(insert_limitacions, df_limitacions.values.tolist())
-conn.commit()
+# Inserir dades de limitacions: la taula es buida i es torna a omplir en una sola transacció
+# (abans es buiden posicions, que es recarrega a continuació, i treballador_limitacio,
+# que s'ha de tornar a generar amb treballador_limitacio.py)
+carregar_taula(conn, 'limitacions', ['id_limitacio', 'limitacio', 'seccio'], df_limitacions,
+               taules_dependents=['treballador_limitacio', 'posicions'])
 print("✅ Dades de limitacions inserides.")
 
 ### --- POSICIONS --- ###
 # Comprovar si existeix la taula 'posicions'
-cursor.execute("""
-IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='posicions' AND xtype='U')
-               CREATE TABLE dbo.posicions (
+crear_taula(conn, 'posicions', """
                 id_posicio int PRIMARY KEY,
                 posicio nvarchar(50),
                 clasificador int,
                 id_limitacio int,
                 familia nvarchar(50),
                 FOREIGN KEY (id_limitacio) REFERENCES limitacions(id_limitacio)
-)
 """)
-conn.commit()
 
 print("✔️ Taula 'posicions' preparada.")
 
 # Inserir dades de posicions
-insert_posicions = """
-INSERT INTO posicions (id_posicio, posicio, clasificador, id_limitacio, familia)
-VALUES (?, ?, ?, ?, ?)
-"""
-cursor.executemany(insert_posicions, df_posicions.values.tolist())
-conn.commit()
+carregar_taula(conn, 'posicions', ['id_posicio', 'posicio', 'clasificador', 'id_limitacio', 'familia'], df_posicions)
 print("✅ Dades de posicions inserides.")
 
 # Tancar connexió
-cursor.close()
 conn.close()
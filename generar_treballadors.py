@@ -2,26 +2,17 @@ import pandas as pd
 from faker import Faker
 import random
 
-import pyodbc
+from carrega_massiva import connectar, crear_taula, carregar_taula
 
-username = 'apineda'
-password = 'apineda'
-server = 'ALBA\\SQLEXPRESS'
-database= 'bdapineda2'
-port = 1433
-driver = 'ODBC Driver 17 for SQL Server'
+# Backend: 'sqlserver' o 'sqlite' (fitxer local, vegeu carrega_massiva.py)
+backend = 'sqlserver'
 
 # Crear conexión
 
-conn = pyodbc.connect(
-    f'DRIVER={{SQL Server}};SERVER={server};DATABASE={database};UID={username};PWD={password}'
-)
-cursor = conn.cursor()
+conn = connectar(backend)
 
 # Crear tabla en SQL Server si no existe
-cursor.execute("""
-IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='treballadors' AND xtype='U')
-               CREATE TABLE dbo.treballadors (
+crear_taula(conn, 'treballadors', """
                 id_treballador int PRIMARY KEY,
                 dni nvarchar(9),
                 nom nvarchar(50), 
@@ -35,9 +26,7 @@ IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='treballadors' AND xtype='U')
                 email nvarchar(50), 
                 seccio nvarchar(50), 
                 torn nvarchar(10)
-)
 """)
-conn.commit()
 
 # Inicializar Faker en español
 fake = Faker("es_ES")
@@ -68,20 +57,18 @@ for i in range(1, num_treballadors + 1):
     )
     treballadors.append(treballador)
 
-print(treballadors)
+print(f"{len(treballadors)} treballadors generats.")
 
 
 
-# Insertar datos en SQL Server
-cursor.executemany("""
-INSERT INTO treballadors (id_treballador, dni, nom, cognom1, cognom2, direccio, sexe, data_naixement, data_antiguitat, telefon, email, seccio, torn)
-VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", treballadors)  
-
-conn.commit()
+# Insertar datos: la taula es buida i es torna a omplir en una sola transacció, amb insercions per lots
+# (abans es buida treballador_limitacio, que hi fa referència; s'ha de tornar a generar amb treballador_limitacio.py)
+carregar_taula(conn, 'treballadors',
+               ['id_treballador', 'dni', 'nom', 'cognom1', 'cognom2', 'direccio', 'sexe', 'data_naixement',
+                'data_antiguitat', 'telefon', 'email', 'seccio', 'torn'],
+               treballadors, taules_dependents=['treballador_limitacio'])
 
 print("✅ Datos insertados correctamente en SQL Server .")
 
 # Cerrar conexión
-cursor.close()
 conn.close()
-
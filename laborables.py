@@ -1,32 +1,21 @@
 import pandas as pd
 import datetime
-import pyodbc
+from carrega_massiva import connectar, crear_taula, carregar_taula
 
 # Definir el año
 año = 2025
 
 
 
-# Configurar conexión a Microsoft SQL Server
-
-username = 'apineda'
-password = 'apineda'
-server = 'ALBA\\SQLEXPRESS'
-database = 'bdapineda2'
-port = 1433
-driver = 'ODBC Driver 17 for SQL Server'
+# Backend: 'sqlserver' o 'sqlite' (fitxer local, vegeu carrega_massiva.py)
+backend = 'sqlserver'
 
 # Crear conexión
 
-conn = pyodbc.connect(
-    f'DRIVER={{SQL Server}};SERVER={server};DATABASE={database};UID={username};PWD={password}'
-)
-cursor = conn.cursor()
+conn = connectar(backend)
 
-# Crear tabla en SQL Server si no existe
-cursor.execute("""
-IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='calendari_laboral' AND xtype='U')
-CREATE TABLE calendari_laboral (
+# Crear tabla si no existe
+crear_taula(conn, 'calendari_laboral', """
     id INT IDENTITY(1,1) PRIMARY KEY,
     numero_dia INT,
     numero_setmana INT,
@@ -34,9 +23,7 @@ CREATE TABLE calendari_laboral (
     aany INT,
     dia_setmana NVARCHAR(20),
     es_laborable BIT
-)
 """)
-conn.commit()
 
 # Lista de festivos (Formato: (mes, día))
 festius = {
@@ -69,16 +56,11 @@ for mes in range(1, 13):  # Meses de 1 a 12
             # Si el día no existe (Ej: 30 de Febrero), se ignora
             continue
 
-# Insertar dades en SQL Server
-cursor.executemany("""
-INSERT INTO calendari_laboral (numero_dia, numero_setmana, numero_mes, aany, dia_setmana, es_laborable)
-VALUES (?, ?, ?, ?, ?, ?)
-""", dades)
-
-conn.commit()
+# Insertar dades: la taula es buida i es torna a omplir en una sola transacció
+carregar_taula(conn, 'calendari_laboral',
+               ['numero_dia', 'numero_setmana', 'numero_mes', 'aany', 'dia_setmana', 'es_laborable'], dades)
 
 print("✅ Datos insertados correctamente en SQL Server sin la columna festivo.")
 
 # Cerrar conexión
-cursor.close()
-conn.close()
\ No newline at end of file
+conn.close()
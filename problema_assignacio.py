@@ -0,0 +1,223 @@
+import os
+import glob
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+from classes_posicions import comprimir_posicions
+from acces_dades import carregar_taules
+
+# Model compilat del problema d'assignació
+# Reuneix en un sol objecte tot el que necessiten els motors (CP-SAT, hongarès, pygad, DEAP i formigues):
+# les taules de posicions i treballadors del torn, els dies laborables i, precalculats com a arrays contigus de numpy,
+#   - les classes d'equivalència de posicions i els seus atributs codificats com a enters (els nuls queden a -1),
+#   - una màscara de bits per classe (bit_familia, bit_limitacio) i una per treballador (mascara_limitacions):
+#     el treballador t té la limitació de la classe c si bits_comuns(mascara_limitacions[t], bit_limitacio[c]).
+#     Cada màscara és una fila de paraules uint64 (64 codis per paraula), de manera que no hi ha límit de famílies
+#     ni de limitacions; amb 64 o menys (el cas habitual) és una sola paraula,
+#   - les classes factibles de cada treballador (estil CSR) i les de cada treballador i classificador,
+#   - la codificació factible dels motors genètics (maxims_gens i descodificar_files, vegeu més avall).
+# Es construeix un sol cop (des de la base de dades o des d'un fitxer .npz guardat abans) i es passa als motors.
+class ProblemaAssignacio:
+    def __init__(self, posicions, treballadors, limitacions_df, dies_laborables, n_hores=8):
+        self.posicions = posicions.reset_index(drop=True)
+        self.treballadors = treballadors.reset_index(drop=True)
+        self.dies_laborables = list(dies_laborables)
+        self.n_hores = n_hores
+        self.n_treballadors = len(self.treballadors)
+        self.n_posicions = len(self.posicions)
+        self.ids_treballadors = self.treballadors['id_treballador'].to_numpy()
+
+        # Només les limitacions dels treballadors del torn
+        limitacions_df = limitacions_df[limitacions_df['id_treballador'].isin(self.ids_treballadors)]
+        self.limitacions = limitacions_df[['id_treballador', 'id_limitacio']].reset_index(drop=True)
+        self.limitacions_dict = self.limitacions.groupby('id_treballador')['id_limitacio'].apply(set).to_dict()
+
+        # Classes de posicions i atributs codificats
+        self.classes, self.membres_classes = comprimir_posicions(self.posicions)
+        self.n_classes = len(self.classes)
+        self.posicio_classe = np.empty(self.n_posicions, dtype=np.int64)
+        for c, membres in enumerate(self.membres_classes):
+            self.posicio_classe[membres] = c
+        self.classe_clasificador, self.clasificadors_unics = pd.factorize(self.classes['clasificador'])
+        self.classe_familia, self.families_uniques = pd.factorize(self.classes['familia'])
+        self.classe_limitacio, self.limitacions_uniques = pd.factorize(self.classes['id_limitacio'])
+        self.bit_familia = bits(self.classe_familia, len(self.families_uniques))
+        self.bit_limitacio = bits(self.classe_limitacio, len(self.limitacions_uniques))
+
+        # Màscara de limitacions per treballador (només compten les limitacions que apareixen a alguna classe)
+        fila = pd.Index(self.ids_treballadors).get_indexer(self.limitacions['id_treballador'])
+        codi = pd.Index(self.limitacions_uniques).get_indexer(self.limitacions['id_limitacio'])
+        self.mascara_limitacions = np.zeros((self.n_treballadors, self.bit_limitacio.shape[1]), dtype=np.uint64)
+        fila, codi = fila[codi >= 0], codi[codi >= 0]
+        np.bitwise_or.at(self.mascara_limitacions, (fila, codi // 64),
+                         np.left_shift(np.uint64(1), (codi % 64).astype(np.uint64)))
+
+        # Classes factibles per treballador: les que no tenen cap limitació seva (totes, si no n'hi ha cap)
+        factible = ~bits_comuns(self.mascara_limitacions[:, None], self.bit_limitacio[None, :])
+        factible[~factible.any(axis=1)] = True
+        self.indptr_factibles = np.concatenate(([0], np.cumsum(factible.sum(axis=1))))
+        fila_factible, self.llista_factibles = np.nonzero(factible)
+
+        # Classes factibles per treballador i classificador: el grup (t, k) és a
+        # llista_clasificador[indptr_clasificador[t * n_clasificadors + k]:indptr_clasificador[t * n_clasificadors + k + 1]]
+        self.n_clasificadors = len(self.clasificadors_unics)
+        grup = fila_factible * self.n_clasificadors + self.classe_clasificador[self.llista_factibles]
+        ordre = np.argsort(grup, kind='stable')
+        self.llista_clasificador = self.llista_factibles[ordre]
+        self.indptr_clasificador = np.concatenate(
+            ([0], np.cumsum(np.bincount(grup, minlength=self.n_treballadors * self.n_clasificadors))))
+
+        # Codificació factible: classificadors que pot fer servir cada treballador (estil CSR) i rang de cada gen
+        self.grau_clasificador = np.diff(self.indptr_clasificador)
+        grau = self.grau_clasificador.reshape((self.n_treballadors, self.n_clasificadors))
+        n_usables = (grau > 0).sum(axis=1)
+        self.indptr_clasificadors_treballador = np.concatenate(([0], np.cumsum(n_usables)))
+        self.llista_clasificadors_treballador = np.nonzero(grau > 0)[1]
+        self.maxims_gens = np.column_stack([n_usables] + [grau.max(axis=1, initial=1)] * self.n_hores).ravel()
+
+    # Matriu booleana (per broadcasting) que indica si cada treballador té la limitació de cada classe
+    def te_limitacio(self, treballadors_idx, classes_idx):
+        return bits_comuns(self.mascara_limitacions[treballadors_idx], self.bit_limitacio[classes_idx])
+
+    # Classes factibles del treballador t; amb clasificador (codi de classificador), només les d'aquest classificador
+    def factibles(self, t, clasificador=None):
+        if clasificador is None:
+            return self.llista_factibles[self.indptr_factibles[t]:self.indptr_factibles[t + 1]]
+        grup = t * self.n_clasificadors + clasificador
+        return self.llista_clasificador[self.indptr_clasificador[grup]:self.indptr_clasificador[grup + 1]]
+
+    # Codificació factible dels motors genètics (pygad i DEAP)
+    # Cada treballador té una fila de 1 + n_hores gens: el primer tria el classificador del dia entre els que el
+    # treballador pot fer servir, i cadascun dels altres una classe de factibles(t, classificador), mòdul la
+    # llargada de la llista. Qualsevol gen entre 0 i maxims_gens (exclòs) dona classes sense cap limitació del
+    # treballador i amb un sol classificador, de manera que la mutació dins d'aquests rangs i el creuament d'un punt
+    # (que conserva la posició dels gens) no surten mai de l'espai factible.
+    # files: array (k, 1 + n_hores) de gens i el treballador de cada fila; retorna (k, n_hores) índexs de classe.
+    def descodificar_files(self, files, treballadors_idx):
+        files = np.asarray(files, dtype=np.int64)
+        treballadors_idx = np.asarray(treballadors_idx)
+        inici = self.indptr_clasificadors_treballador[treballadors_idx]
+        n_usables = self.indptr_clasificadors_treballador[treballadors_idx + 1] - inici
+        clasificador = self.llista_clasificadors_treballador[inici + np.clip(files[:, 0], 0, n_usables - 1)]
+        grup = treballadors_idx * self.n_clasificadors + clasificador
+        columna = files[:, 1:] % self.grau_clasificador[grup][:, None]
+        return self.llista_clasificador[self.indptr_clasificador[grup][:, None] + columna]
+
+    # El mateix per a un o més cromosomes sencers (n_treballadors * (1 + n_hores) gens cadascun);
+    # retorna n_treballadors * n_hores índexs de classe per cromosoma
+    def descodificar_gens(self, genes):
+        genes = np.asarray(genes, dtype=np.int64)
+        files = genes.reshape((-1, self.n_hores + 1))
+        treballadors_idx = np.tile(np.arange(self.n_treballadors), len(files) // max(self.n_treballadors, 1))
+        return self.descodificar_files(files, treballadors_idx).reshape(genes.shape[:-1] + (-1,))
+
+    # Càrrega des de la base de dades: posicions, treballadors del torn, limitacions i els pròxims n_dies laborables
+    # (només les columnes necessàries, amb els filtres fets a SQL i amb snapshot local; vegeu acces_dades.py)
+    @classmethod
+    def des_de_bd(cls, engine, torn='matí', n_dies=7):
+        posicions, treballadors, limitacions_df, dies_laborables = carregar_taules(engine, torn, n_dies)
+        return cls(posicions, treballadors, limitacions_df, dies_laborables)
+
+    # Serialització a .npz: només es guarden les taules d'entrada (els arrays derivats es recalculen en carregar)
+    # Les columnes de text i de dates es guarden com a cadenes.
+    def guardar(self, fitxer):
+        arrays = {'dies_laborables': np.array(self.dies_laborables, dtype=str),
+                  'n_hores': np.array(self.n_hores)}
+        for nom, taula in [('posicions', self.posicions), ('treballadors', self.treballadors),
+                           ('limitacions', self.limitacions)]:
+            for columna in taula.columns:
+                valors = taula[columna]
+                if pd.api.types.is_numeric_dtype(valors) and not pd.api.types.is_bool_dtype(valors):
+                    arrays[f'{nom}__{columna}'] = valors.to_numpy()
+                else:
+                    arrays[f'{nom}__{columna}'] = valors.where(valors.notna(), '').astype(str).to_numpy(dtype=str)
+        np.savez_compressed(fitxer, **arrays)
+
+    @classmethod
+    def carregar(cls, fitxer):
+        with np.load(fitxer, allow_pickle=False) as dades:
+            taules = {}
+            for clau in dades.files:
+                if '__' in clau:
+                    nom, columna = clau.split('__', 1)
+                    taules.setdefault(nom, {})[columna] = dades[clau]
+            dies_laborables = dades['dies_laborables'].tolist()
+            n_hores = int(dades['n_hores'])
+        return cls(pd.DataFrame(taules['posicions']), pd.DataFrame(taules['treballadors']),
+                   pd.DataFrame(taules['limitacions']), dies_laborables, n_hores)
+
+    # Memòria compartida
+    # Tots els arrays numèrics del model es copien en un únic bloc multiprocessing.shared_memory (alineats a 8 bytes);
+    # la resta d'atributs (taules, classes, índexs de pandas), que són petits, van al descriptor.
+    # Retorna el bloc (qui el crea l'ha de tancar i alliberar amb unlink) i el descriptor, que és el que es passa als processos.
+    def a_memoria_compartida(self):
+        arrays = {nom: valor for nom, valor in vars(self).items()
+                  if isinstance(valor, np.ndarray) and valor.dtype != object}
+        atributs = {nom: valor for nom, valor in vars(self).items() if nom not in arrays}
+        disposicio = []
+        offset = 0
+        for nom, array in arrays.items():
+            disposicio.append((nom, array.dtype.str, array.shape, offset))
+            offset += -(-array.nbytes // 8) * 8
+        memoria = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for nom, dtype, forma, inici in disposicio:
+            np.ndarray(forma, dtype=dtype, buffer=memoria.buf, offset=inici)[...] = arrays[nom]
+        return memoria, (memoria.name, disposicio, atributs)
+
+    # Reconstrueix el model en un altre procés amb vistes de només lectura sobre el bloc, sense copiar ni recalcular arrays
+    @classmethod
+    def des_de_memoria_compartida(cls, descriptor):
+        nom_memoria, disposicio, atributs = descriptor
+        problema = cls.__new__(cls)
+        problema.__dict__.update(atributs)
+        problema.memoria_compartida = shared_memory.SharedMemory(name=nom_memoria)
+        for nom, dtype, forma, inici in disposicio:
+            vista = np.ndarray(forma, dtype=dtype, buffer=problema.memoria_compartida.buf, offset=inici)
+            vista.flags.writeable = False
+            setattr(problema, nom, vista)
+        return problema
+
+# Màscara de cada codi: una fila de paraules uint64 per a n_codis codis diferents, amb el bit del codi encès
+# (tot zeros per als codis -1, és a dir, valors nuls)
+def bits(codis, n_codis):
+    codis = np.asarray(codis)
+    mascara = np.zeros((len(codis), max(1, -(-n_codis // 64))), dtype=np.uint64)
+    valids = np.flatnonzero(codis >= 0)
+    mascara[valids, codis[valids] // 64] = np.left_shift(np.uint64(1), (codis[valids] % 64).astype(np.uint64))
+    return mascara
+
+# Si dues màscares (o arrays de màscares, amb broadcasting) tenen algun bit en comú
+def bits_comuns(a, b):
+    return (a & b).any(axis=-1)
+
+# Problemes ja carregats en aquest procés, per torn, i torn que s'ha de fer servir en comptes del dels motors
+# (els omple l'executor paral·lel als seus processos abans d'importar un motor; vegeu execucio_paralela.py)
+problemes_compartits = {}
+torn_actiu = None
+
+# Fitxer .npz d'un torn i un dia a partir del que indiquen els motors: 'problema_mati.npz' -> 'problema_mati_matí_2025-04-10.npz'
+# Els dies laborables del problema es compten a partir d'avui, de manera que un fitxer només val per al torn i el dia
+# en què es va crear.
+def fitxer_torn_dia(fitxer, torn, dia=None):
+    arrel, extensio = os.path.splitext(fitxer)
+    dia = dia or pd.Timestamp.today().strftime('%Y-%m-%d')
+    return f"{arrel}_{torn}_{dia}{extensio or '.npz'}"
+
+# Punt d'entrada dels motors: si hi ha el fitxer del torn i del dia es carrega d'allà sense tocar la base de dades;
+# si no, es carrega de la base de dades i, si s'ha indicat fitxer, es guarda per a les execucions següents del mateix
+# torn i dia (i s'esborren els d'aquest torn de dies anteriors).
+# (El fitxer no es refresca sol: s'ha d'esborrar si les taules canvien durant el dia.)
+def carregar_problema(engine, fitxer=None, torn='matí'):
+    torn = torn_actiu or torn
+    if torn in problemes_compartits:
+        return problemes_compartits[torn]
+    fitxer_avui = fitxer_torn_dia(fitxer, torn) if fitxer else None
+    if fitxer_avui and os.path.exists(fitxer_avui):
+        return ProblemaAssignacio.carregar(fitxer_avui)
+    problema = ProblemaAssignacio.des_de_bd(engine, torn)
+    if fitxer_avui:
+        problema.guardar(fitxer_avui)
+        for antic in glob.glob(fitxer_torn_dia(fitxer, torn, '*')):
+            if antic != fitxer_avui:
+                os.remove(antic)
+    return problema
@@ -0,0 +1,141 @@
+import io
+import time
+import asyncio
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from urllib.parse import unquote
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from cache_assignacions import CacheAssignacions, crear_client
+from resultats_assignacions import etiquetes_hores
+
+# Prova de càrrega del quiosc al canvi de torn
+# Simula n_consultes treballadors que consulten alhora la seva assignació, contra un magatzem d'objectes local
+# (un servidor HTTP que respon com MiniO als GET i HEAD, amb latencia_magatzem segons de retard per petició).
+# Es comparen tres maneres de servir les consultes:
+#   - 'directe': com abans, cada consulta descarrega i llegeix el CSV del torn i en recorre les files,
+#   - 'cache': CacheAssignacions buida a l'inici del canvi de torn (les consultes comparteixen una sola descàrrega),
+#   - 'precarregat': el fitxer del torn ja s'ha precarregat uns minuts abans, com fa web_gradio.py.
+# Per a cada manera es mostra el rendiment (consultes/s), la latència p50 i p99 i les peticions rebudes pel magatzem.
+n_consultes = 500
+n_treballadors = 5000
+n_hores = 8
+latencia_magatzem = 0.02
+port = 9099
+bucket = "assignacions-csv"
+nom_objecte = "assignacions_cpsat/assignacions_2025-01-06_matí.csv"
+maneres = ['directe', 'cache', 'precarregat']
+
+# 🔹 Magatzem d'objectes local
+objectes = {}  # nom (bucket/clau) -> (contingut, etag)
+peticions = {'GET': 0, 'HEAD': 0}
+
+class MagatzemLocal(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def respondre(self, amb_contingut):
+        time.sleep(latencia_magatzem)
+        peticions[self.command] += 1
+        objecte = objectes.get(unquote(self.path.split('?')[0].lstrip('/')))
+        if objecte is None:
+            cos = b'<Error><Code>NoSuchKey</Code><Message>No existeix</Message></Error>'
+            self.send_response(404)
+            self.send_header('Content-Type', 'application/xml')
+            self.send_header('Content-Length', str(len(cos) if amb_contingut else 0))
+            self.end_headers()
+            if amb_contingut:
+                self.wfile.write(cos)
+            return
+        contingut, etag = objecte
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv')
+        self.send_header('Content-Length', str(len(contingut)))
+        self.send_header('ETag', f'"{etag}"')
+        self.send_header('Last-Modified', format_datetime(datetime.now(timezone.utc), usegmt=True))
+        self.end_headers()
+        if amb_contingut:
+            self.wfile.write(contingut)
+
+    def do_GET(self):
+        self.respondre(True)
+
+    def do_HEAD(self):
+        self.respondre(False)
+
+# Fitxer d'un torn amb el mateix format que escriuen els motors
+def fitxer_torn_sintetic():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'data': '2025-01-06',
+        'hora': np.tile(etiquetes_hores(n_hores), n_treballadors),
+        'id_treballador': np.repeat(np.arange(1, n_treballadors + 1), n_hores),
+        'nom': np.repeat([f"Treballador {i}" for i in range(1, n_treballadors + 1)], n_hores),
+        'posicio': rng.integers(1, 100, n_treballadors * n_hores).astype(str),
+        'clasificador': rng.integers(1, 5, n_treballadors * n_hores),
+    })
+    buffer = io.BytesIO()
+    df.to_csv(buffer, index=False, encoding='utf-8-sig')
+    contingut = buffer.getvalue()
+    return contingut, hashlib.md5(contingut).hexdigest()
+
+# 🔹 Consultes (el mateix camí que consulta() de web_gradio.py, sense la interfície)
+def consulta_directa(client, codi, minut):
+    resposta = client.get_object(bucket, nom_objecte)
+    df = pd.read_csv(io.BytesIO(resposta.read()), encoding='utf-8-sig')
+    resposta.close()
+    resposta.release_conn()
+    assignacio = None
+    for _, row in df[df['id_treballador'] == codi].iterrows():
+        inici, fi = row['hora'].split(' - ')
+        if int(inici[:2]) * 60 + int(inici[3:]) <= minut <= int(fi[:2]) * 60 + int(fi[3:]):
+            assignacio = row
+    return assignacio
+
+async def consulta_amb_cache(cache, codi, minut):
+    index = await cache.obtenir_async(nom_objecte)
+    if index is None or not index.te_treballador(codi):
+        return None
+    return index.activa(codi, minut)
+
+async def una_consulta(manera, client, cache, codi, minut, latencies):
+    inici = time.perf_counter()
+    if manera == 'directe':
+        assignacio = await asyncio.to_thread(consulta_directa, client, codi, minut)
+    else:
+        assignacio = await consulta_amb_cache(cache, codi, minut)
+    latencies.append(time.perf_counter() - inici)
+    return assignacio is not None
+
+async def rafega(manera, client, cache, codis, minut):
+    latencies = []
+    inici = time.perf_counter()
+    resultats = await asyncio.gather(*[una_consulta(manera, client, cache, int(codi), minut, latencies) for codi in codis])
+    return time.perf_counter() - inici, np.array(latencies), sum(resultats)
+
+if __name__ == '__main__':
+    objectes[f"{bucket}/{nom_objecte}"] = fitxer_torn_sintetic()
+    servidor = ThreadingHTTPServer(('127.0.0.1', port), MagatzemLocal)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    client = crear_client(f"127.0.0.1:{port}", mida_pool=32)
+
+    codis = np.random.default_rng(1).integers(1, n_treballadors + 1, n_consultes)
+    minut = 6 * 60 + 5  # 06:05, just després del canvi de torn
+    print(f"{n_consultes} consultes simultànies, {n_treballadors} treballadors, "
+          f"{len(objectes[f'{bucket}/{nom_objecte}'][0]) / 1e6:.1f} MB per fitxer, {latencia_magatzem * 1000:.0f} ms de latència")
+    for manera in maneres:
+        cache = CacheAssignacions(client, bucket)
+        if manera == 'precarregat':
+            cache.obtenir(nom_objecte)
+        peticions.update(GET=0, HEAD=0)
+        durada, latencies, trobades = asyncio.run(rafega(manera, client, cache, codis, minut))
+        print(f"{manera:>12}: {n_consultes / durada:10.0f} consultes/s   p50 {np.percentile(latencies, 50) * 1000:9.2f} ms   "
+              f"p99 {np.percentile(latencies, 99) * 1000:9.2f} ms   {peticions['GET']} GET, {peticions['HEAD']} HEAD   "
+              f"({trobades} assignacions trobades)")
+    servidor.shutdown()
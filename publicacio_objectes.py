@@ -0,0 +1,139 @@
+import os
+import time
+import queue
+import random
+import shutil
+import hashlib
+import threading
+
+# Publicació en segon pla dels fitxers dels motors a l'emmagatzematge d'objectes (MiniO o S3 compatible)
+# Els motors posen cada fitxer acabat a la cua amb publicar() i continuen amb el dia següent mentre un grup de fils
+# el puja. La cua és acotada (mida_cua): si els fils no donen l'abast, publicar() espera (i la memòria no creix).
+# Cada pujada es reintenta fins a reintents vegades amb espera exponencial (espera_inicial, 2x, 4x, ... amb una mica
+# d'atzar); si tot i així falla, l'error queda registrat i es continua amb els altres fitxers.
+# Abans de pujar es compara l'SHA-256 del fitxer amb el de l'objecte guardat: si coincideix, no es torna a pujar.
+# Backends:
+#   - BackendMinio: un bucket de MiniO; l'SHA-256 es guarda a les metadades de l'objecte (x-amz-meta-sha256).
+#   - BackendFitxers: una carpeta local amb la mateixa estructura de noms, per provar sense servidor.
+
+# Configuració de MiniO per defecte
+servidor_minio = "localhost:9000"
+access_key = "minioadmin"
+secret_key = "minioadmin"
+bucket_per_defecte = "assignacions-csv"
+carpeta_objectes = 'objectes_locals'
+
+mida_bloc = 1 << 20
+
+def hash_fitxer(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for bloc in iter(lambda: f.read(mida_bloc), b''):
+            h.update(bloc)
+    return h.hexdigest()
+
+class BackendMinio:
+    def __init__(self, client, bucket):
+        self.client = client
+        self.bucket = bucket
+
+    # SHA-256 de l'objecte guardat (None si no existeix o si es va pujar sense metadades)
+    def hash_objecte(self, nom_objecte):
+        from minio.error import S3Error
+        try:
+            estat = self.client.stat_object(self.bucket, nom_objecte)
+        except S3Error as e:
+            if e.code in ('NoSuchKey', 'NoSuchObject', 'ResourceNotFound'):
+                return None
+            raise
+        metadades = {clau.lower(): valor for clau, valor in (estat.metadata or {}).items()}
+        return metadades.get('x-amz-meta-sha256')
+
+    def pujar(self, path_local, nom_objecte, hash_contingut):
+        self.client.fput_object(self.bucket, nom_objecte, path_local, metadata={'sha256': hash_contingut})
+
+class BackendFitxers:
+    def __init__(self, carpeta):
+        self.carpeta = carpeta
+
+    def hash_objecte(self, nom_objecte):
+        path = os.path.join(self.carpeta, nom_objecte)
+        return hash_fitxer(path) if os.path.exists(path) else None
+
+    def pujar(self, path_local, nom_objecte, hash_contingut):
+        desti = os.path.join(self.carpeta, nom_objecte)
+        os.makedirs(os.path.dirname(desti), exist_ok=True)
+        temporal = f"{desti}.{threading.get_ident()}.tmp"
+        shutil.copyfile(path_local, temporal)
+        os.replace(temporal, desti)
+
+# Backend de la configuració per defecte: 'minio' o 'fitxers'
+def crear_backend(tipus='minio', bucket=None):
+    if tipus == 'fitxers':
+        return BackendFitxers(carpeta_objectes)
+    from minio import Minio
+    client = Minio(servidor_minio, access_key=access_key, secret_key=secret_key, secure=False)
+    return BackendMinio(client, bucket or bucket_per_defecte)
+
+class Publicador:
+    def __init__(self, backend, n_fils=4, mida_cua=16, reintents=5, espera_inicial=0.5):
+        self.backend = backend
+        self.reintents = reintents
+        self.espera_inicial = espera_inicial
+        self.cua = queue.Queue(maxsize=mida_cua)
+        self.bloqueig = threading.Lock()
+        self.pujats = []
+        self.omesos = []
+        self.errors = []
+        self.fils = [threading.Thread(target=self.treballar, daemon=True) for _ in range(n_fils)]
+        for fil in self.fils:
+            fil.start()
+
+    # Posa un fitxer a la cua (espera si la cua és plena); nom_objecte per defecte: la ruta relativa amb '/'
+    def publicar(self, path_local, nom_objecte=None):
+        self.cua.put((path_local, nom_objecte or path_local.replace(os.sep, '/')))
+
+    def treballar(self):
+        while True:
+            element = self.cua.get()
+            try:
+                if element is None:
+                    return
+                self.publicar_ara(*element)
+            finally:
+                self.cua.task_done()
+
+    def publicar_ara(self, path_local, nom_objecte):
+        for intent in range(self.reintents + 1):
+            try:
+                hash_contingut = hash_fitxer(path_local)
+                if self.backend.hash_objecte(nom_objecte) == hash_contingut:
+                    resultat = self.omesos
+                else:
+                    self.backend.pujar(path_local, nom_objecte, hash_contingut)
+                    resultat = self.pujats
+                with self.bloqueig:
+                    resultat.append(nom_objecte)
+                return
+            except Exception as e:
+                if intent == self.reintents:
+                    print(f"❌ No s'ha pogut pujar {nom_objecte}: {e}")
+                    with self.bloqueig:
+                        self.errors.append((nom_objecte, str(e)))
+                    return
+                time.sleep(self.espera_inicial * 2 ** intent * (1 + random.random() / 2))
+
+    # Espera que s'hagin pujat tots els fitxers de la cua i atura els fils
+    def tancar(self):
+        for _ in self.fils:
+            self.cua.put(None)
+        for fil in self.fils:
+            fil.join()
+        print(f"✅ Publicació acabada: {len(self.pujats)} pujats, {len(self.omesos)} sense canvis, "
+              f"{len(self.errors)} errors")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcio):
+        self.tancar()
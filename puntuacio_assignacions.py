@@ -0,0 +1,148 @@
+import os
+import re
+import glob
+import pandas as pd
+from sqlalchemy import create_engine, select
+from acces_dades import posicions_t, treballadors_t, limitacions_t
+
+# Puntuació comuna de les assignacions de tots els motors
+# Carrega qualsevol nombre de CSV d'assignacions (de qualsevol carpeta assignacions_*) en una sola taula
+# i calcula, per a cada (motor, data, torn), amb operacions vectoritzades per grups:
+#   - limitacions: hores en una posició amb una limitació del treballador,
+#   - canvis_classificador: classificadors de més que fa servir un treballador durant el dia,
+#   - families_consecutives: hores seguides d'un treballador a la mateixa família,
+#   - posicions_duplicades: ocupacions de més d'una posició a la mateixa hora,
+#   - hores_sense_assignar: hores de treballador sense posició (forats de cobertura),
+# i un cost total ponderat amb pesos, que és l'objectiu comú per comparar els motors.
+# Els CSV difereixen segons el motor (ordre de columnes, sense id_posicio a DEAP, hora "06:00 - 07:00" o "6:00"):
+# aquí es normalitzen tots al mateix format.
+carpetes_motors = {
+    'assignacions_aco': 'formiga',
+    'assignacions_cpsat': 'cpsat',
+    'assignacions_deap': 'deap',
+    'assignacions_generic': 'generic',
+    'assignacions_hungarian': 'hungarian',
+}
+columnes = ['data', 'hora', 'id_treballador', 'id_posicio', 'posicio', 'clasificador', 'familia']
+violacions = ['limitacions', 'canvis_classificador', 'families_consecutives', 'posicions_duplicades']
+pesos = {'limitacions': 1000, 'canvis_classificador': 100, 'families_consecutives': 10, 'posicions_duplicades': 100,
+         'hores_sense_assignar': 1}
+grups = ['motor', 'data', 'torn']
+
+# Motor i torn a partir de la ruta: carpeta assignacions_<motor>/ i nom assignacions_<data>[_<torn>].csv
+def motor_i_torn(fitxer):
+    carpeta = os.path.basename(os.path.dirname(os.path.abspath(fitxer)))
+    nom = re.match(r'assignacions_\d{4}-\d{2}-\d{2}(?:_(.+))?\.csv$', os.path.basename(fitxer))
+    torn = nom.group(1) if nom and nom.group(1) else ''
+    return carpetes_motors.get(carpeta, carpeta), torn.lower()
+
+def llegir_fitxer(fitxer):
+    df = pd.read_csv(fitxer, encoding='utf-8-sig', usecols=lambda columna: columna in columnes)
+    df['motor'], df['torn'] = motor_i_torn(fitxer)
+    return df
+
+# Una sola taula amb les assignacions de tots els fitxers (llista de rutes o patrons glob)
+# hora passa a ser l'hora d'inici (enter); motor, data, torn i posicio queden com a categories.
+def carregar_assignacions(fitxers):
+    rutes = sorted({ruta for patro in fitxers for ruta in glob.glob(patro)})
+    if not rutes:
+        return normalitzar(pd.DataFrame(columns=columnes + ['motor', 'torn']))
+    df = pd.concat([llegir_fitxer(ruta) for ruta in rutes], ignore_index=True)
+    return normalitzar(df)
+
+# Normalitza un DataFrame d'assignacions d'un motor (el que retornen les funcions generar_assignacions_*)
+def normalitzar(df, motor=None, torn=''):
+    df = df.copy()
+    if motor is not None:
+        df['motor'] = motor
+        df['torn'] = torn
+    for columna in columnes:
+        if columna not in df.columns:
+            df[columna] = pd.NA
+    # Les hores són poques i es repeteixen molt: s'interpreten un cop per categoria
+    hores = df['hora'].astype(str).astype('category')
+    inici_hora = hores.cat.categories.str.extract(r'^\s*(\d+)', expand=False).astype(float)
+    df['hora'] = pd.Series(inici_hora.to_numpy()[hores.cat.codes], index=df.index)
+    df['data'] = df['data'].astype(str)
+    for columna in grups + ['posicio']:
+        df[columna] = df[columna].astype('category')
+    return df[grups + [columna for columna in columnes if columna not in grups]]
+
+# Puntuació per (motor, data, torn)
+# posicions: id_posicio, posicio, id_limitacio; limitacions: id_treballador, id_limitacio;
+# treballadors (opcional): id_treballador i, si en té, torn. Amb treballadors, la cobertura es compta sobre
+# tots els del torn del grup (o tots, si el grup no té torn); sense, sobre els que apareixen al grup.
+def puntuar_assignacions(df, posicions, limitacions, treballadors=None, n_hores=8):
+    df = df[df['posicio'].notna() & df['hora'].notna()].copy()
+
+    # Posició i limitació de cada fila (els motors que no escriuen id_posicio es resolen pel nom i el classificador,
+    # perquè hi ha noms de posició repetits en classificadors diferents)
+    id_per_nom = posicions.drop_duplicates(['posicio', 'clasificador']).set_index(['posicio', 'clasificador'])['id_posicio']
+    sense_id = df['id_posicio'].isna()
+    if sense_id.any():
+        claus = pd.MultiIndex.from_arrays([df.loc[sense_id, 'posicio'].astype(object), df.loc[sense_id, 'clasificador']])
+        df.loc[sense_id, 'id_posicio'] = id_per_nom.reindex(claus).to_numpy()
+    limitacio_posicio = posicions.drop_duplicates('id_posicio').set_index('id_posicio')['id_limitacio']
+    df['id_limitacio'] = df['id_posicio'].map(limitacio_posicio)
+
+    resultat = pd.DataFrame(index=pd.MultiIndex.from_frame(df[grups].drop_duplicates().astype(object)))
+
+    amb_limitacio = df.merge(limitacions[['id_treballador', 'id_limitacio']].drop_duplicates(),
+                             on=['id_treballador', 'id_limitacio'])
+    resultat['limitacions'] = amb_limitacio.groupby(grups, observed=True).size()
+
+    n_classificadors = df.groupby(grups + ['id_treballador'], observed=True)['clasificador'].nunique()
+    resultat['canvis_classificador'] = (n_classificadors - 1).clip(lower=0).groupby(grups, observed=True).sum()
+
+    df['grup'] = df.groupby(grups, observed=True).ngroup()
+    df = df.sort_values(['grup', 'id_treballador', 'hora'])
+    seguent = df[['grup', 'id_treballador', 'hora', 'familia']].shift(-1)
+    mateix_dia = (df['grup'] == seguent['grup']) & (df['id_treballador'] == seguent['id_treballador'])
+    repetides = mateix_dia & (df['hora'] + 1 == seguent['hora']) & (df['familia'] == seguent['familia'])
+    resultat['families_consecutives'] = df[repetides].groupby(grups, observed=True).size()
+
+    duplicades = df.duplicated(grups + ['hora', 'id_posicio'])
+    resultat['posicions_duplicades'] = df[duplicades].groupby(grups, observed=True).size()
+
+    # Cobertura: hores esperades (treballadors x n_hores) menys hores amb alguna posició
+    hores_cobertes = df.drop_duplicates(grups + ['id_treballador', 'hora']).groupby(grups, observed=True).size()
+    if treballadors is None:
+        esperats = df.groupby(grups, observed=True)['id_treballador'].nunique()
+    else:
+        esperats = pd.Series(len(treballadors), index=resultat.index)
+        if 'torn' in treballadors.columns:
+            per_torn = treballadors['torn'].str.lower().value_counts()
+            torns = resultat.index.get_level_values('torn')
+            esperats = esperats.where(torns == '', torns.map(per_torn).fillna(0).to_numpy())
+    resultat['hores_sense_assignar'] = (esperats * n_hores - hores_cobertes.reindex(resultat.index).fillna(0)).clip(lower=0)
+
+    resultat = resultat.fillna(0).astype(int)
+    resultat['total'] = resultat[violacions].sum(axis=1)
+    resultat['cost'] = sum(resultat[nom] * pes for nom, pes in pesos.items())
+    return resultat.sort_index()
+
+# Resum per motor: suma de cada mesura i nombre de dies puntuats
+def resum_per_motor(puntuacions):
+    resum = puntuacions.groupby(level='motor').sum()
+    resum['dies'] = puntuacions.groupby(level='motor').size()
+    return resum.sort_values('cost')
+
+if __name__ == '__main__':
+    # Connexió a la base de dades SQL Server
+    username = 'apineda'
+    password = 'apineda'
+    server = 'ALBA\\SQLEXPRESS'
+    database = 'bdapineda2'
+    driver = 'ODBC Driver 17 for SQL Server'
+    connection_url = f'mssql+pyodbc://{username}:{password}@{server}/{database}?driver={driver}'
+    engine = create_engine(connection_url)
+
+    with engine.connect() as connexio:
+        posicions = pd.read_sql(select(posicions_t), connexio)
+        limitacions = pd.read_sql(select(limitacions_t), connexio)
+        treballadors = pd.read_sql(select(treballadors_t.c.id_treballador, treballadors_t.c.torn), connexio)
+
+    df = carregar_assignacions([os.path.join(carpeta, 'assignacions_*.csv') for carpeta in carpetes_motors])
+    puntuacions = puntuar_assignacions(df, posicions, limitacions, treballadors)
+    puntuacions.to_csv('puntuacio_assignacions.csv', encoding='utf-8-sig')
+    print(resum_per_motor(puntuacions).to_string())
@@ -0,0 +1,186 @@
+import os
+import io
+import csv
+import glob
+import time
+import socket
+import atexit
+import threading
+import pandas as pd
+from datetime import datetime
+from minio.error import S3Error
+
+# Registre de validacions del quiosc (només afegir) i compactació diària
+# Cada validació s'escriu al segment obert del procés: un fitxer CSV local a carpeta_local/<host>-<pid>/,
+# amb flush i fsync, de manera que validar té un cost constant durant tot el dia i una validació confirmada
+# no es perd encara que el procés caigui. Un fil en segon pla tanca el segment cada interval segons i el puja
+# com un objecte nou i immutable a <carpeta_remota>segments/<dia>/<host>-<pid>-<instant>.csv; els processos
+# (i els fils d'un mateix procés) no es trepitgen mai perquè cap objecte es reescriu.
+# Els segments que no s'han pogut pujar es tornen a provar al cicle següent; els dels processos que ja no
+# existeixen (per exemple, després d'una caiguda) els adopta el primer registre que s'inicia a la mateixa màquina.
+# compactar_dia (la feina periòdica, vegeu el final del fitxer) ajunta els segments d'un dia amb el fitxer diari
+# <carpeta_remota><dia>.csv, el reescriu i esborra els segments ajuntats. Ha d'haver-hi un sol procés de compactació.
+# Al fitxer diari, cada validació porta un identificador (id_registre): el nom del segment d'on surt i el número
+# de fila dins del segment, que no canvien mai perquè els segments són immutables.
+columnes_validacio = ['timestamp', 'id_treballador', 'data', 'hora', 'posicio', 'clasificador']
+columnes_diari = columnes_validacio + ['id_registre']
+carpeta_local = 'validacions_pendents'
+
+def proces_viu(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class RegistreValidacions:
+    def __init__(self, client, bucket, carpeta_remota, interval=5.0):
+        self.client = client
+        self.bucket = bucket
+        self.carpeta_remota = carpeta_remota
+        self.interval = interval
+        self.identificador = f"{socket.gethostname()}-{os.getpid()}"
+        self.carpeta = os.path.join(carpeta_local, self.identificador)
+        os.makedirs(self.carpeta, exist_ok=True)
+        self.adoptar_segments_orfes()
+
+        self.bloqueig = threading.Lock()
+        self.segment = None  # (fitxer obert, ruta, dia)
+        self.aturar = threading.Event()
+        self.fil = threading.Thread(target=self.buidar_periodicament, daemon=True)
+        self.fil.start()
+        atexit.register(self.tancar)
+
+    # Segments pendents de processos d'aquesta màquina que ja no existeixen
+    def adoptar_segments_orfes(self):
+        prefix = f"{socket.gethostname()}-"
+        for carpeta in glob.glob(os.path.join(carpeta_local, prefix + '*')):
+            pid = os.path.basename(carpeta)[len(prefix):]
+            if carpeta == self.carpeta or not pid.isdigit() or proces_viu(int(pid)):
+                continue
+            for ruta in glob.glob(os.path.join(carpeta, '*.csv')) + glob.glob(os.path.join(carpeta, '*.csv.obert')):
+                nom = os.path.basename(ruta).replace('.csv.obert', '.csv')
+                os.replace(ruta, os.path.join(self.carpeta, nom))
+            os.rmdir(carpeta)
+
+    # Afegeix una validació (diccionari amb columnes_validacio); quan retorna, el registre ja és al disc
+    def afegir(self, registre):
+        dia = str(registre['timestamp'])[:10]
+        with self.bloqueig:
+            if self.segment is not None and self.segment[2] != dia:
+                self.tancar_segment()
+            if self.segment is None:
+                ruta = os.path.join(self.carpeta, f"{dia}_{time.time_ns()}.csv.obert")
+                fitxer = open(ruta, 'w', newline='', encoding='utf-8')
+                csv.writer(fitxer).writerow(columnes_validacio)
+                self.segment = (fitxer, ruta, dia)
+            fitxer = self.segment[0]
+            csv.writer(fitxer).writerow([registre[columna] for columna in columnes_validacio])
+            fitxer.flush()
+            os.fsync(fitxer.fileno())
+
+    # Tanca el segment obert (s'ha de cridar amb el bloqueig); el fitxer tancat queda a punt per pujar
+    def tancar_segment(self):
+        fitxer, ruta, _ = self.segment
+        fitxer.close()
+        os.replace(ruta, ruta[:-len('.obert')])
+        self.segment = None
+
+    # Puja els segments tancats; els que fallen es queden per al cicle següent
+    def pujar_segments(self):
+        for ruta in sorted(glob.glob(os.path.join(self.carpeta, '*.csv'))):
+            dia, instant = os.path.basename(ruta)[:-len('.csv')].split('_')
+            nom_objecte = f"{self.carpeta_remota}segments/{dia}/{self.identificador}-{instant}.csv"
+            try:
+                self.client.fput_object(self.bucket, nom_objecte, ruta, content_type="text/csv")
+                os.remove(ruta)
+            except Exception as e:
+                print(f"⚠️ No s'ha pogut pujar el segment {nom_objecte}: {e}")
+
+    def buidar(self):
+        with self.bloqueig:
+            if self.segment is not None:
+                self.tancar_segment()
+        self.pujar_segments()
+
+    def buidar_periodicament(self):
+        while not self.aturar.wait(self.interval):
+            self.buidar()
+
+    def tancar(self):
+        self.aturar.set()
+        self.fil.join()
+        self.buidar()
+        try:
+            os.rmdir(self.carpeta)  # només si ja no queda cap segment per pujar
+        except OSError:
+            pass
+
+def llegir_objecte(client, bucket, nom_objecte):
+    resposta = client.get_object(bucket, nom_objecte)
+    try:
+        return pd.read_csv(io.BytesIO(resposta.read()), encoding='utf-8-sig')
+    finally:
+        resposta.close()
+        resposta.release_conn()
+
+# Validacions d'un segment amb el seu id_registre (<nom del segment>:<fila>)
+def llegir_segment(client, bucket, nom_objecte):
+    df = llegir_objecte(client, bucket, nom_objecte)
+    segment = nom_objecte.rsplit('/', 1)[-1][:-len('.csv')]
+    df['id_registre'] = [f"{segment}:{fila}" for fila in range(len(df))]
+    return df
+
+# Ajunta els segments d'un dia amb el fitxer diari i esborra els segments ajuntats; retorna quants n'ha ajuntat
+# Si una compactació s'atura entre escriure el fitxer diari i esborrar els segments, la següent els tornarà a
+# llegir: per això es treuen les files amb un id_registre repetit. Dues validacions iguals (mateix treballador,
+# posició i instant) són registres diferents i es mantenen totes dues; les files dels fitxers diaris antics,
+# sense id_registre, també.
+def compactar_dia(client, bucket, carpeta_remota, dia):
+    segments = [obj.object_name for obj in
+                client.list_objects(bucket, prefix=f"{carpeta_remota}segments/{dia}/", recursive=True)]
+    if not segments:
+        return 0
+    fitxer_diari = f"{carpeta_remota}{dia}.csv"
+    parts = [llegir_segment(client, bucket, nom) for nom in segments]
+    # Només es continua sense fitxer diari si no existeix: qualsevol altre error atura la compactació
+    # (si no, es reescriuria el fitxer diari només amb els segments nous i es perdrien les validacions ja compactades)
+    try:
+        parts.insert(0, llegir_objecte(client, bucket, fitxer_diari))
+    except S3Error as e:
+        if e.code != 'NoSuchKey':
+            raise
+    df = pd.concat(parts, ignore_index=True).reindex(columns=columnes_diari)
+    df = df[df['id_registre'].isna() | ~df.duplicated('id_registre')].sort_values('timestamp', kind='stable')
+
+    buffer = io.BytesIO()
+    df.to_csv(buffer, index=False, encoding='utf-8-sig')
+    buffer.seek(0)
+    client.put_object(bucket, fitxer_diari, data=buffer, length=buffer.getbuffer().nbytes, content_type="text/csv")
+    for nom in segments:
+        client.remove_object(bucket, nom)
+    return len(segments)
+
+# Compactació de tots els dies que tenen segments (per executar periòdicament, p. ex. cada 5 minuts amb cron)
+if __name__ == '__main__':
+    from minio import Minio
+    minio_client = Minio(
+        "localhost:9000",
+        access_key="minioadmin",
+        secret_key="minioadmin",
+        secure=False
+    )
+    bucket_name = "assignacions-csv"
+    carpeta_validacions = "validacions_cpsat/"
+
+    dies = sorted({obj.object_name.rstrip('/').split('/')[-1] for obj in
+                   minio_client.list_objects(bucket_name, prefix=f"{carpeta_validacions}segments/")})
+    for dia in dies:
+        try:
+            n_segments = compactar_dia(minio_client, bucket_name, carpeta_validacions, dia)
+        except Exception as e:
+            print(f"❌ {dia}: compactació aturada, els segments es queden per a la propera execució: {e}")
+            continue
+        print(f"✔️ {dia}: {n_segments} segments compactats ({datetime.now().isoformat(timespec='seconds')})")
@@ -0,0 +1,87 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Resultats dels motors
+# taula_assignacions construeix la taula d'assignacions d'un dia directament de la matriu (treballadors x hores)
+# d'índexs de posició, amb indexació d'arrays (sense un diccionari per fila ni consultes amb iloc),
+# ja ordenada per treballador i hora.
+# guardar_assignacions l'escriu en els formats de formats_resultats:
+#   - 'csv': el CSV de sempre a output_folder (UTF-8 amb BOM), que és el que es puja a MiniO i llegeix el quiosc,
+#   - 'parquet': un fitxer Parquet particionat per motor, torn i data (estil Hive) a carpeta_parquet:
+#     resultats_parquet/motor=cpsat/torn=matí/data=2025-04-10/part-0.parquet
+# De la part Parquet se'n poden llegir només les columnes i particions necessàries amb llegir_resultats.
+formats_resultats = ['csv', 'parquet']
+carpeta_parquet = 'resultats_parquet'
+columnes_resultats = ['data', 'hora', 'id_treballador', 'nom', 'id_posicio', 'posicio', 'clasificador', 'familia']
+particions = ['motor', 'torn', 'data']
+
+# Error d'un motor que no arriba a cap assignació vàlida per a un dia; porta la millor que ha trobat, ja com a
+# taula d'assignacions, perquè qui el crida la pugui puntuar igualment (vegeu benchmark.py)
+class AssignacioNoValida(Exception):
+    def __init__(self, missatge, assignacions):
+        super().__init__(missatge)
+        self.assignacions = assignacions
+
+# Etiqueta de cada hora del torn ("06:00 - 07:00", ...)
+def etiquetes_hores(n_hores, hora_inici=6):
+    return np.array([f"{hora_inici + h:02d}:00 - {hora_inici + h + 1:02d}:00" for h in range(n_hores)])
+
+# solucio: matriu (n_treballadors, n_hores) d'índexs de fila de posicions; els índexs fora de rang
+# (n_posicions, assignació buida) no generen fila. columnes permet triar l'ordre de les columnes de cada motor.
+def taula_assignacions(solucio, treballadors, posicions, data, columnes=None):
+    solucio = np.asarray(solucio)
+    n_treballadors, n_hores = solucio.shape
+    ordre = np.argsort(treballadors['id_treballador'].to_numpy(), kind='stable')
+    fila = np.repeat(ordre, n_hores)
+    hora = np.tile(np.arange(n_hores), n_treballadors)
+    idx = solucio[ordre].ravel()
+    valides = (idx >= 0) & (idx < len(posicions))
+    fila, hora, idx = fila[valides], hora[valides], idx[valides]
+
+    # Les columnes de text es fan categòriques a partir dels codis: no es crea cap cadena per fila
+    codi_nom, noms = pd.factorize(treballadors['nom'])
+    codi_posicio, noms_posicions = pd.factorize(posicions['posicio'])
+    df = pd.DataFrame({
+        'data': pd.Categorical.from_codes(np.zeros(len(idx), dtype=np.int8), [data]),
+        'hora': pd.Categorical.from_codes(hora, etiquetes_hores(n_hores)),
+        'id_treballador': treballadors['id_treballador'].to_numpy()[fila],
+        'nom': pd.Categorical.from_codes(codi_nom[fila], noms),
+        'id_posicio': posicions['id_posicio'].to_numpy()[idx],
+        'posicio': pd.Categorical.from_codes(codi_posicio[idx], noms_posicions),
+        'clasificador': posicions['clasificador'].to_numpy()[idx],
+        'familia': posicions['familia'].to_numpy()[idx],
+    })
+    return df[columnes or columnes_resultats]
+
+def ruta_particio(motor, data, torn=None):
+    return os.path.join(carpeta_parquet, f"motor={motor}", f"torn={torn or 'cap'}", f"data={data}")
+
+# Escriu les assignacions d'un dia; retorna la ruta del CSV (o la del Parquet, si no es fa CSV)
+def guardar_assignacions(df, output_folder, motor, data, torn=None):
+    output_path = None
+    if 'parquet' in formats_resultats:
+        carpeta = ruta_particio(motor, data, torn)
+        try:
+            os.makedirs(carpeta, exist_ok=True)
+            # Les columnes de partició van al nom de la carpeta, no dins del fitxer
+            temporal = os.path.join(carpeta, 'part-0.parquet.tmp')
+            df.drop(columns=[c for c in particions if c in df.columns]).to_parquet(temporal, index=False)
+            output_path = os.path.join(carpeta, 'part-0.parquet')
+            os.replace(temporal, output_path)
+        except ImportError:
+            print("⚠️ No hi ha cap llibreria de Parquet (pyarrow o fastparquet): només es guarda el CSV.")
+    if 'csv' in formats_resultats or output_path is None:
+        sufix = f"_{torn}" if torn else ""
+        output_path = os.path.join(output_folder, f"assignacions_{data}{sufix}.csv")
+        df.to_csv(output_path, index=False, encoding='utf-8-sig')
+    return output_path
+
+# Lectura de la part Parquet: només les columnes demanades i les particions que passen els filtres
+# (motor, torn i dates poden ser un valor o una llista; None vol dir totes)
+def llegir_resultats(columnes=None, motor=None, torn=None, dates=None):
+    filtres = []
+    for nom, valor in [('motor', motor), ('torn', torn), ('data', dates)]:
+        if valor is not None:
+            filtres.append((nom, 'in', [valor] if isinstance(valor, str) else list(valor)))
+    return pd.read_parquet(carpeta_parquet, columns=columnes, filters=filtres or None)
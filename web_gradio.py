@@ -1,43 +1,34 @@
 import gradio as gr
-import pandas as pd
-from minio import Minio
-from io import BytesIO
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
 import pytz
+import time
+import asyncio
+import threading
 import subprocess
+from registre_validacions import RegistreValidacions
+from cache_assignacions import CacheAssignacions, crear_client
 
-#Connexió a MinIO
-minio_client = Minio(
-    "minio:9000",
-    access_key="minioadmin",
-    secret_key="minioadmin",
-    secure=False
-)
+#Connexió a MinIO (connexions persistents compartides per totes les consultes)
+minio_client = crear_client("minio:9000", access_key="minioadmin", secret_key="minioadmin", mida_pool=32)
 
 bucket_name = "assignacions-csv"
 carpeta_assignacions = "assignacions_cpsat/"
 carpeta_validacions = "validacions_cpsat/"
+registre_validacions = RegistreValidacions(minio_client, bucket_name, carpeta_validacions)
+# Fitxers de torn ja descarregats i indexats per treballador (es revaliden per ETag cada ttl segons, vegeu cache_assignacions.py)
+cache_assignacions = CacheAssignacions(minio_client, bucket_name, ttl=30)
+# El fitxer del torn següent es carrega minuts_precarrega minuts abans del canvi de torn (i del canvi de dia)
+minuts_precarrega = 5
 
 zona_horaria = pytz.timezone("Europe/Madrid")
 
 def ara_local():
     return datetime.now(zona_horaria)
 
-#Interpretar franja horària "08:00-09:00" amb fus horari
-def parse_franja_horaria(interval):
-    try:
-        start_str, end_str = interval.split("-")
-        start_dt = zona_horaria.localize(datetime.strptime(start_str.strip(), "%H:%M"))
-        end_dt = zona_horaria.localize(datetime.strptime(end_str.strip(), "%H:%M"))
-        return start_dt.time(), end_dt.time()
-    except Exception as e:
-        print(f"Error en parse_franja_horaria: {e}")
-        return None, None
-
-#Determinar el torn actual
-def obtenir_torn_actual():
-    hora = ara_local().hour
+#Determinar el torn actual (o el d'un altre moment)
+def obtenir_torn_actual(moment=None):
+    hora = (moment or ara_local()).hour
     if 6 <= hora < 14:
         return "matí"
     elif 14 <= hora < 22:
@@ -45,43 +36,40 @@ def obtenir_torn_actual():
     else:
         return "nit"
 
-#Consultar assignació
-def consulta(codi):
-    global assignacio_actual
-    assignacio_actual = None
+#Fitxer d'assignacions del torn d'un moment
+def fitxer_torn(moment):
+    return f"{carpeta_assignacions}assignacions_{moment.strftime('%Y-%m-%d')}_{obtenir_torn_actual(moment)}.csv"
 
+#Precàrrega del torn següent: a l'hora del canvi, totes les consultes ja troben el fitxer a la memòria
+#Si el fitxer encara no s'ha publicat, es torna a provar cada minut (una precàrrega fallida no es recorda)
+def precarregar_torns():
+    while True:
+        try:
+            cache_assignacions.precarregar(fitxer_torn(ara_local() + timedelta(minutes=minuts_precarrega)))
+        except Exception as e:
+            print(f"Error en precarregar el torn següent: {e}")
+        time.sleep(60)
+
+#Consultar assignació (l'assignació trobada es guarda a l'estat de la sessió, per validar-la després)
+async def consulta(codi):
     try:
         codi_int = int(codi)
     except:
-        return "Introdueix un codi vàlid.", gr.update(visible=False), ""
+        return "Introdueix un codi vàlid.", gr.update(visible=False), "", None
 
-    torn = obtenir_torn_actual()
+    ara = ara_local()
+    torn = obtenir_torn_actual(ara)
     #data_avui = "2025-05-02"  # Per a proves, utilitzem una data fixa
-    data_avui = ara_local().strftime('%Y-%m-%d')
-    fitxer_torn = f"{carpeta_assignacions}assignacions_{data_avui}_{torn}.csv"
-
-    try:
-        response = minio_client.get_object(bucket_name, fitxer_torn)
-        df = pd.read_csv(BytesIO(response.read()), encoding='utf-8-sig')
-        response.close()
-        response.release_conn()
-    except Exception:
-        return f"No hi ha assignacions disponibles per al torn de **{torn}** ({data_avui}).", gr.update(visible=False), ""
+    data_avui = ara.strftime('%Y-%m-%d')
 
-    df_treballador = df[df['id_treballador'] == codi_int]
-    if df_treballador.empty:
-        return "El treballador no pertany a aquest torn.", gr.update(visible=False), ""
+    index = await cache_assignacions.obtenir_async(fitxer_torn(ara))
+    if index is None:
+        return f"No hi ha assignacions disponibles per al torn de **{torn}** ({data_avui}).", gr.update(visible=False), "", None
 
-    ara = ara_local().time()
-    assignacions_valides = []
+    if not index.te_treballador(codi_int):
+        return "El treballador no pertany a aquest torn.", gr.update(visible=False), "", None
 
-    for _, row in df_treballador.iterrows():
-        start, end = parse_franja_horaria(row['hora'])
-        if start and end and start <= ara <= end:
-            assignacions_valides.append(row)
-
-    if assignacions_valides:
-        assignacio_actual = assignacions_valides[-1]
+    assignacio_actual = index.activa(codi_int, ara.hour * 60 + ara.minute + ara.second / 60)
 
     if assignacio_actual is not None:
         text = f"""
@@ -94,16 +82,14 @@ def consulta(codi):
 **Posició:** {assignacio_actual['posicio']}
 **Clasificador:** {assignacio_actual['clasificador']}
 """
-        return text, gr.update(visible=True), ""
+        return text, gr.update(visible=True), "", assignacio_actual
     else:
-        return "Ara mateix no tens cap assignació activa.", gr.update(visible=False), ""
+        return "Ara mateix no tens cap assignació activa.", gr.update(visible=False), "", None
 
 # 🔹 Validar assignació actual
-def validar():
-    global assignacio_actual
-
+async def validar(assignacio_actual):
     if assignacio_actual is None:
-        return "❌ Cap assignació activa per validar."
+        return "❌ Cap assignació activa per validar.", None
 
     registre = {
         "timestamp": ara_local().isoformat(timespec="seconds"),
@@ -114,36 +100,12 @@ def validar():
         "clasificador": assignacio_actual['clasificador']
     }
 
-    fitxer_validacio = f"{carpeta_validacions}{datetime.now().strftime('%Y-%m-%d')}.csv"
-
+    # S'afegeix al registre de validacions (segment local i pujada a MinIO en segon pla, vegeu registre_validacions.py)
     try:
-        try:
-            resposta = minio_client.get_object(bucket_name, fitxer_validacio)
-            df_ant = pd.read_csv(BytesIO(resposta.read()), encoding='utf-8-sig')
-            resposta.close()
-            resposta.release_conn()
-        except:
-            df_ant = pd.DataFrame()
-
-        df_total = pd.concat([df_ant, pd.DataFrame([registre])], ignore_index=True)
-
-        buffer = BytesIO()
-        df_total.to_csv(buffer, index=False, encoding='utf-8-sig')
-        buffer.seek(0)
-
-        minio_client.put_object(
-            bucket_name,
-            fitxer_validacio,
-            data=buffer,
-            length=buffer.getbuffer().nbytes,
-            content_type="text/csv"
-        )
-
+        await asyncio.to_thread(registre_validacions.afegir, registre)
     except Exception as e:
-        return f"⚠️ Error al pujar la validació a MinIO: {e}"
-
-    assignacio_actual = None
-    return "✅ Validació enregistrada correctament!"
+        return f"⚠️ Error en enregistrar la validació: {e}", assignacio_actual
+    return "✅ Validació enregistrada correctament!", None
 
 def executar_script():
     try:
@@ -173,6 +135,7 @@ with gr.Blocks(theme=gr.themes.Citrus()) as app:
         validar_btn = gr.Button("✅ Validar Assignació", visible=False)
         resultat_md = gr.Markdown()
         tornar_menu = gr.Button("🔙 Tornar al menú")
+        assignacio_sessio = gr.State(None)
 
     # 🔸 Funcions de navegació
     def mostra_assignacions():
@@ -185,8 +148,12 @@ with gr.Blocks(theme=gr.themes.Citrus()) as app:
     btn_assignacions.click(mostra_assignacions, outputs=[menu_page, assignacions_page])
     tornar_menu.click(torna_menu, outputs=[menu_page, assignacions_page])
     btn_executar.click(lambda: (executar_script(), gr.update(visible=True)), outputs=[output_script, output_script])
-    consulta_btn.click(consulta, inputs=codi_input, outputs=[output_md, validar_btn, resultat_md])
-    validar_btn.click(validar, outputs=resultat_md)
+    # Sense límit de concurrència: els handlers són asíncrons i al canvi de torn arriben totes les consultes alhora
+    consulta_btn.click(consulta, inputs=codi_input, outputs=[output_md, validar_btn, resultat_md, assignacio_sessio],
+                       concurrency_limit=None)
+    validar_btn.click(validar, inputs=assignacio_sessio, outputs=[resultat_md, assignacio_sessio], concurrency_limit=None)
+
+threading.Thread(target=precarregar_torns, daemon=True).start()
 
 
 app.launch(server_name="0.0.0.0", server_port=7860)
\ No newline at end of file
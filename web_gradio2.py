@@ -4,6 +4,7 @@ from minio import Minio
 from io import BytesIO
 from datetime import datetime
 import os
+from registre_validacions import RegistreValidacions
 
 # 🔹 Connexió a MinIO
 minio_client = Minio(
@@ -18,6 +19,7 @@ carpeta_assignacions = "assignacions_cpsat/"
 fitxer_avui = f"{carpeta_assignacions}assignacions_{datetime.now().strftime('%Y-%m-%d')}.csv"
 carpeta_validacions = "validacions_cpsat/"
 fitxer_validacions = f"{carpeta_assignacions}{datetime.now().strftime('%Y-%m-%d')}.csv"
+registre_validacions = RegistreValidacions(minio_client, bucket_name, carpeta_validacions)
 
 # 🔹 Interpretar franja horària "08:00-09:00"
 def parse_franja_horaria(interval):
@@ -90,38 +92,11 @@ def validar():
         "clasificador": assignacio_actual['clasificador']
     }
 
-    df_validacio = pd.DataFrame([registre])
-
+    # S'afegeix al registre de validacions (segment local i pujada a MinIO en segon pla, vegeu registre_validacions.py)
     try:
-        # Llegeix l'existent o crea un nou DataFrame
-        dia_avui = datetime.now().strftime('%Y-%m-%d')
-        fitxer_validacio = f"validacions_cpsat/{dia_avui}.csv"
-
-        try:
-            resposta = minio_client.get_object(bucket_name, fitxer_validacio)
-            df_ant = pd.read_csv(BytesIO(resposta.read()), encoding='utf-8-sig')
-            resposta.close()
-            resposta.release_conn()
-        except:
-            df_ant = pd.DataFrame()
-
-        df_total = pd.concat([df_ant, df_validacio], ignore_index=True)
-
-        # Escriu a bytes
-        buffer = BytesIO()
-        df_total.to_csv(buffer, index=False, encoding='utf-8-sig')
-        buffer.seek(0)
-
-        minio_client.put_object(
-            bucket_name,
-            fitxer_validacio,
-            data=buffer,
-            length=buffer.getbuffer().nbytes,
-            content_type="text/csv"
-        )
-
+        registre_validacions.afegir(registre)
     except Exception as e:
-        return f"⚠️ Error al pujar a MinIO: {e}"
+        return f"⚠️ Error en enregistrar la validació: {e}"
     assignacio_actual = None  # Global per ús compartit
     return "✅ Validació enregistrada correctament!"
 